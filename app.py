@@ -11,6 +11,15 @@ from flask import send_file
 import io
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import desc
+import click
+from services.cache_respostas import em_cache, iniciar_cache, cache_respostas
+from services.etag import condicional_periodo
+from services.snapshot_valores import obter_snapshot
+from services.indice_periodos import obter_indice_periodos
+from services.meses_sujos import recalcular_meses_sujos
+from services.respostas import iniciar_respostas
+from services.perfil_sqlite import iniciar_banco
+from services.persistencia import verificar_esquema
 
 
 # Criar aplicação Flask
@@ -19,10 +28,19 @@ app.config.from_object(Config)
 
 # Inicializar banco de dados
 db.init_app(app)
+iniciar_banco(app)
+iniciar_cache(app)
+iniciar_respostas(app)
 
 # Criar pasta database se não existir
 os.makedirs(os.path.join(app.root_path, 'database'), exist_ok=True)
 
+if app.config.get('VERIFICAR_ESQUEMA', True):
+    # Bancos anteriores às tabelas de controle / índice único: as migrações
+    # (migrar_indices.py, migrar_valores_unicos.py) alteram o esquema; aqui só se confere
+    with app.app_context():
+        verificar_esquema()
+
 @app.route('/')
 def index():
     """Rota principal - redireciona para dashboard"""
@@ -35,279 +53,167 @@ def dashboard():
 
 #API DE ATUALIZAÇÃO ANUAL
 @app.route('/api/anos-disponiveis')
+@em_cache()
 def api_anos_disponiveis():
     """Retorna lista de anos que possuem dados no banco"""
+    from services.dashboard import montar_anos_disponiveis
+    
     try:
-        # Busca todos os anos distintos na tabela de valores
-        anos_query = db.session.query(ValorMensal.ano).distinct().order_by(ValorMensal.ano).all()
-        # Extrai apenas o número do ano da tupla (ano,) -> ano
-        anos = [a[0] for a in anos_query if a[0] >= 2022] # Filtra a partir de 2022
-        
-        # Se não houver dados, garante pelo menos o ano atual
-        if not anos:
-            import datetime
-            anos = [datetime.datetime.now().year]
-            
-        return jsonify(anos)
+        # Anos do índice de períodos (a partir de 2022; sem dados = ano atual)
+        return jsonify(montar_anos_disponiveis(obter_indice_periodos().anos()))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/series')
+@em_cache()
+def api_series():
+    """
+    Histórico mensal de várias contas em uma consulta
+
+    Ex: /api/series?contas=97,84,85&de=2022&ate=2025
+    Retorna {'meses': [...], 'anos': [...], 'series': {conta: {ano: [12 valores]}}}
+    """
+    from services.series import buscar_series, MESES_ABREV
+    
+    try:
+        contas = [int(c) for c in request.args.get('contas', '').split(',') if c.strip()]
+        if not contas:
+            return jsonify({'error': 'Informe as contas (ex: ?contas=97,84,85)'}), 400
+        ano_de = request.args.get('de', type=int)
+        ano_ate = request.args.get('ate', type=int)
+        
+        recalcular_meses_sujos((1, ano_de) if ano_de else None, (12, ano_ate) if ano_ate else None)
+        resultado = buscar_series(contas, ano_de, ano_ate)
+        return jsonify({
+            'meses': MESES_ABREV,
+            'anos': resultado['anos'],
+            'series': {
+                str(conta_id): {str(ano): valores for ano, valores in por_ano.items()}
+                for conta_id, por_ano in resultado['series'].items()
+            }
+        })
+    except ValueError:
+        return jsonify({'error': 'Contas inválidas'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/ebitda-historico')
+@em_cache()
 def api_dashboard_ebitda_historico():
     """Retorna dados históricos do EBITDA % (Dinâmico)"""
+    from services.series import historico_conta
+    
     try:
-        # Busca anos disponíveis (>= 2023 para este gráfico)
-        anos_query = db.session.query(ValorMensal.ano).distinct().filter(ValorMensal.ano >= 2023).order_by(ValorMensal.ano).all()
-        anos = [a[0] for a in anos_query]
-        
-        if not anos: anos = [2023, 2024, 2025] # Fallback
-
-        resposta = {'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']}
-        
-        for ano in anos:
-            dados_ano = [0] * 12
-            valores = ValorMensal.query.filter_by(conta_id=97, ano=ano).all() # ID 97 = EBITDA %
-            for v in valores:
-                if 1 <= v.mes <= 12:
-                    dados_ano[v.mes - 1] = round(v.valor, 2)
-            
-            # Cria a chave dinâmica (ex: dados_2023, dados_2026)
-            resposta[f'dados_{ano}'] = dados_ano
-            
-        return jsonify(resposta)
+        # Anos >= 2023 para este gráfico
+        recalcular_meses_sujos((1, 2023))
+        return jsonify(historico_conta(97, ano_de=2023, anos_padrao=[2023, 2024, 2025])) # ID 97 = EBITDA %
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/liquidez-historico')
+@em_cache()
 def api_dashboard_liquidez_historico():
     """Retorna dados históricos da Liquidez Corrente (Dinâmico)"""
+    from services.series import historico_conta
+    
     try:
-        anos_query = db.session.query(ValorMensal.ano).distinct().filter(ValorMensal.ano >= 2023).order_by(ValorMensal.ano).all()
-        anos = [a[0] for a in anos_query]
-        if not anos: anos = [2023, 2024, 2025]
-
-        resposta = {'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']}
-        
-        for ano in anos:
-            dados_ano = [0] * 12
-            valores = ValorMensal.query.filter_by(conta_id=84, ano=ano).all() # ID 84 = Liquidez Corrente
-            for v in valores:
-                if 1 <= v.mes <= 12:
-                    dados_ano[v.mes - 1] = round(v.valor, 2)
-            resposta[f'dados_{ano}'] = dados_ano
-            
-        return jsonify(resposta)
+        recalcular_meses_sujos((1, 2023))
+        return jsonify(historico_conta(84, ano_de=2023, anos_padrao=[2023, 2024, 2025])) # ID 84 = Liquidez Corrente
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 @app.route('/api/dashboard/liquidez-seca-historico')
+@em_cache()
 def api_dashboard_liquidez_seca_historico():
     """Retorna dados históricos da Liquidez Seca (Dinâmico)"""
+    from services.series import historico_conta
+    
     try:
-        anos_query = db.session.query(ValorMensal.ano).distinct().filter(ValorMensal.ano >= 2023).order_by(ValorMensal.ano).all()
-        anos = [a[0] for a in anos_query]
-        if not anos: anos = [2023, 2024, 2025]
-
-        resposta = {'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']}
-        
-        for ano in anos:
-            dados_ano = [0] * 12
-            valores = ValorMensal.query.filter_by(conta_id=85, ano=ano).all() # ID 85 = Liquidez Seca
-            for v in valores:
-                if 1 <= v.mes <= 12:
-                    dados_ano[v.mes - 1] = round(v.valor, 2)
-            resposta[f'dados_{ano}'] = dados_ano
-            
-        return jsonify(resposta)
+        recalcular_meses_sujos((1, 2023))
+        return jsonify(historico_conta(85, ano_de=2023, anos_padrao=[2023, 2024, 2025])) # ID 85 = Liquidez Seca
     except Exception as e:
         return jsonify({'error': str(e)}), 500
      
 @app.route('/api/dashboard/resultado-operacional-historico')
+@em_cache()
 def api_dashboard_resultado_operacional_historico():
     """Retorna dados históricos do Resultado Operacional (Dinâmico)"""
+    from services.series import historico_conta
+    
     try:
         # Filtra >= 2024 conforme sua regra original
-        anos_query = db.session.query(ValorMensal.ano).distinct().filter(ValorMensal.ano >= 2024).order_by(ValorMensal.ano).all()
-        anos = [a[0] for a in anos_query]
-        if not anos: anos = [2024, 2025]
-
-        resposta = {'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']}
-        
-        for ano in anos:
-            dados_ano = [0] * 12
-            valores = ValorMensal.query.filter_by(conta_id=18, ano=ano).all() # ID 18 = Resultado Operacional
-            for v in valores:
-                if 1 <= v.mes <= 12:
-                    dados_ano[v.mes - 1] = round(v.valor, 2)
-            resposta[f'dados_{ano}'] = dados_ano
-            
-        return jsonify(resposta)
+        recalcular_meses_sujos((1, 2024))
+        return jsonify(historico_conta(18, ano_de=2024, anos_padrao=[2024, 2025])) # ID 18 = Resultado Operacional
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 @app.route('/api/dashboard/ativo-circulante-historico')
+@em_cache()
 def api_dashboard_ativo_circulante_historico():
     """Retorna dados históricos do Ativo Circulante (Dinâmico)"""
+    from services.series import historico_conta
+    
     try:
-        anos_query = db.session.query(ValorMensal.ano).distinct().filter(ValorMensal.ano >= 2024).order_by(ValorMensal.ano).all()
-        anos = [a[0] for a in anos_query]
-        if not anos: anos = [2024, 2025]
-
-        resposta = {'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']}
-        
-        for ano in anos:
-            dados_ano = [0] * 12
-            valores = ValorMensal.query.filter_by(conta_id=52, ano=ano).all() # ID 52 = Ativo Circulante
-            for v in valores:
-                if 1 <= v.mes <= 12:
-                    dados_ano[v.mes - 1] = round(v.valor, 2)
-            resposta[f'dados_{ano}'] = dados_ano
-            
-        return jsonify(resposta)
+        recalcular_meses_sujos((1, 2024))
+        return jsonify(historico_conta(52, ano_de=2024, anos_padrao=[2024, 2025])) # ID 52 = Ativo Circulante
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/capital-circulante-historico')
+@em_cache()
 def api_dashboard_capital_circulante_historico():
     """Retorna dados históricos do Capital Circulante (Dinâmico)"""
+    from services.series import historico_conta
+    
     try:
-        anos_query = db.session.query(ValorMensal.ano).distinct().filter(ValorMensal.ano >= 2024).order_by(ValorMensal.ano).all()
-        anos = [a[0] for a in anos_query]
-        if not anos: anos = [2024, 2025]
-
-        resposta = {'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']}
-        
-        for ano in anos:
-            dados_ano = [0] * 12
-            valores = ValorMensal.query.filter_by(conta_id=87, ano=ano).all() # ID 87 = Capital Circulante
-            for v in valores:
-                if 1 <= v.mes <= 12:
-                    dados_ano[v.mes - 1] = round(v.valor, 2)
-            resposta[f'dados_{ano}'] = dados_ano
-            
-        return jsonify(resposta)
+        recalcular_meses_sujos((1, 2024))
+        return jsonify(historico_conta(87, ano_de=2024, anos_padrao=[2024, 2025])) # ID 87 = Capital Circulante
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/evolucao-receita/total-disponivel-historico')
+@em_cache()
 def api_total_disponivel_historico():
     """Retorna dados históricos do Total Disponível (ID 37) para 2023, 2024, 2025"""
+    from services.series import buscar_series, MESES_ABREV
+    
     try:
-        dados = {
-            '2023': [0] * 12,
-            '2024': [0] * 12,
-            '2025': [0] * 12
-        }
-        
-        # Buscar valores de Total Disponível (ID 37) para os 3 anos
+        recalcular_meses_sujos((1, 2023), (12, 2025))
+        series = buscar_series([37], 2023, 2025)['series'][37]
+        resposta = {'meses': MESES_ABREV}
         for ano in [2023, 2024, 2025]:
-            valores = ValorMensal.query.filter_by(
-                conta_id=37,
-                ano=ano
-            ).order_by(ValorMensal.mes).all()
-            
-            for v in valores:
-                dados[str(ano)][v.mes - 1] = round(v.valor, 2)
-        
-        return jsonify({
-            'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez'],
-            'dados_2023': dados['2023'],
-            'dados_2024': dados['2024'],
-            'dados_2025': dados['2025']
-        })
+            resposta[f'dados_{ano}'] = series.get(ano, [0] * 12)
+        return jsonify(resposta)
     except Exception as e:
         return jsonify({'error': str(e)}), 500       
 
 @app.route('/api/evolucao-receita/receita-mensal-historico')
+@em_cache()
 def api_receita_mensal_historico():
     """Retorna dados históricos da Receita Operacional Mensal (ID 1) para 2022, 2023, 2024, 2025"""
+    from services.series import buscar_series, MESES_ABREV
+    
     try:
-        dados = {
-            '2022': [0] * 12,
-            '2023': [0] * 12,
-            '2024': [0] * 12,
-            '2025': [0] * 12
-        }
-        
-        # Buscar valores de Receita Operacional (ID 1) para os 4 anos
+        recalcular_meses_sujos((1, 2022), (12, 2025))
+        series = buscar_series([1], 2022, 2025)['series'][1]
+        resposta = {'meses': MESES_ABREV}
         for ano in [2022, 2023, 2024, 2025]:
-            valores = ValorMensal.query.filter_by(
-                conta_id=1,
-                ano=ano
-            ).order_by(ValorMensal.mes).all()
-            
-            for v in valores:
-                dados[str(ano)][v.mes - 1] = round(v.valor, 2)
-        
-        return jsonify({
-            'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez'],
-            'dados_2022': dados['2022'],
-            'dados_2023': dados['2023'],
-            'dados_2024': dados['2024'],
-            'dados_2025': dados['2025']
-        })
+            resposta[f'dados_{ano}'] = series.get(ano, [0] * 12)
+        return jsonify(resposta)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/evolucao-receita/receita-acumulada-historico')
+@em_cache()
 def api_receita_acumulada_historico():
     """Retorna dados históricos da Receita Acumulada (ID 101) para 2022, 2023, 2024, 2025"""
+    from services.series import receita_acumulada_historico
+    
     try:
-        dados = {
-            '2022': [0] * 12,
-            '2023': [0] * 12,
-            '2024': [0] * 12,
-            '2025': [0] * 12
-        }
-        
-        # Buscar valores de Receita Acumulada (ID 101) para os 4 anos
-        for ano in [2022, 2023, 2024, 2025]:
-            valores = ValorMensal.query.filter_by(
-                conta_id=101,
-                ano=ano
-            ).order_by(ValorMensal.mes).all()
-            
-            for v in valores:
-                dados[str(ano)][v.mes - 1] = round(v.valor, 2)
-        
-        # Descobrir qual é o último mês com dados em 2025
-        ultimo_mes_2025 = 12
-        for mes in range(11, -1, -1):  # De dezembro até janeiro
-            if dados['2025'][mes] > 0:
-                ultimo_mes_2025 = mes + 1  # +1 porque array começa em 0
-                break
-        
-        # Calcular % de crescimento vs ano anterior (COMPARANDO MESMO PERÍODO)
-        crescimentos = {}
-        
-        for ano in [2023, 2024, 2025]:
-            ano_anterior = ano - 1
-            
-            # Para 2025, comparar só até o último mês disponível
-            if ano == 2025:
-                mes_comparacao = ultimo_mes_2025 - 1  # -1 porque array começa em 0
-            else:
-                mes_comparacao = 11  # Dezembro (índice 11)
-            
-            valor_atual = dados[str(ano)][mes_comparacao]
-            valor_anterior = dados[str(ano_anterior)][mes_comparacao]
-            
-            if valor_anterior > 0:
-                percentual = ((valor_atual - valor_anterior) / valor_anterior) * 100
-                crescimentos[str(ano)] = round(percentual, 2)
-            else:
-                crescimentos[str(ano)] = 0
-        
-        return jsonify({
-            'meses': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez'],
-            'dados_2022': dados['2022'],
-            'dados_2023': dados['2023'],
-            'dados_2024': dados['2024'],
-            'dados_2025': dados['2025'],
-            'crescimentos': crescimentos,
-            'ultimo_mes_2025': ultimo_mes_2025  # Informação extra para debug
-        })
+        # Valores de 2022 a 2025 e % de crescimento de cada ano (mesmo período)
+        recalcular_meses_sujos((1, 2022), (12, 2025))
+        return jsonify(receita_acumulada_historico())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -523,16 +429,61 @@ def api_contas_entrada_manual():
     return jsonify([conta.to_dict() for conta in contas])
 
 @app.route('/api/valores/<int:mes>/<int:ano>')
+@condicional_periodo
+@em_cache(por_periodo=True)
 def api_valores(mes, ano):
     """Retorna os valores de um mês/ano específico"""
-    valores_db = ValorMensal.query.filter_by(mes=mes, ano=ano).all()
+    # {conta_id: valor}, do snapshot em memória (mês sujo já recalculado por condicional_periodo)
+    return jsonify(obter_snapshot().valores_mes(mes, ano))
+
+@app.route('/api/valores')
+@em_cache()
+def api_valores_intervalo():
+    """
+    Valores de vários meses em formato de colunas
+
+    Ex: /api/valores?de=2024-01&ate=2025-12&contas=1,15,21 (sem contas = todas com valor)
+    No máximo API_VALORES_MAXIMO_MESES meses por requisição.
+    Retorna {'contas': [...], 'periodos': ['2024-01', ...], 'valores': [...]}, onde
+    valores é a matriz contas x períodos achatada por linha:
+    valores[i * len(periodos) + j] = conta i no período j (null = sem valor)
+    """
+    from services.periodos import indice_periodo, periodo_do_indice, ler_periodo
     
-    # Criar dicionário {conta_id: valor}
-    valores = {}
-    for v in valores_db:
-        valores[v.conta_id] = v.valor
-    
-    return jsonify(valores)
+    try:
+        de = request.args.get('de')
+        if not de:
+            return jsonify({'error': 'Informe o mês inicial (ex: ?de=2024-01&ate=2025-12)'}), 400
+        try:
+            inicio = indice_periodo(*ler_periodo(de))
+            fim = indice_periodo(*ler_periodo(request.args.get('ate', de)))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if fim < inicio:
+            return jsonify({'error': 'ate deve ser igual ou posterior a de'}), 400
+        # Limita a matriz e os recálculos de meses sujos feitos nesta leitura
+        maximo = app.config.get('API_VALORES_MAXIMO_MESES', 120)
+        if fim - inicio + 1 > maximo:
+            return jsonify({'error': f'Intervalo maior que {maximo} meses'}), 400
+        
+        try:
+            contas = [int(c) for c in request.args['contas'].split(',') if c.strip()] \
+                if request.args.get('contas') else None
+        except ValueError:
+            return jsonify({'error': 'Contas inválidas'}), 400
+        
+        # Meses do intervalo alterados desde o último cálculo: recalcula antes de responder
+        recalcular_meses_sujos(periodo_do_indice(inicio), periodo_do_indice(fim))
+        
+        contas, matriz = obter_snapshot().matriz(inicio, fim, contas)
+        periodos = [periodo_do_indice(i) for i in range(inicio, fim + 1)]
+        return jsonify({
+            'contas': contas,
+            'periodos': [f"{ano}-{mes:02d}" for mes, ano in periodos],
+            'valores': [None if v != v else v for v in matriz.ravel().tolist()]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/contas-balanco')
 def api_contas_balanco():
@@ -545,44 +496,36 @@ def api_salvar_dados():
     """Salva os dados do formulário e executa os cálculos"""
     try:
         dados = request.get_json()
-        mes = dados['mes']
-        ano = dados['ano']
+        mes = int(dados['mes'])
+        ano = int(dados['ano'])
         valores = dados['valores']
         
-        # Salvar cada valor de entrada manual
-        for conta_id, valor in valores.items():
-            conta_id = int(conta_id)
-            valor = float(valor)
-            
-            # Verificar se já existe
-            valor_existente = ValorMensal.query.filter_by(
-                conta_id=conta_id,
-                mes=mes,
-                ano=ano
-            ).first()
-            
-            if valor_existente:
-                # Atualizar
-                valor_existente.valor = valor
-            else:
-                # Criar novo
-                novo_valor = ValorMensal(
-                    conta_id=conta_id,
-                    mes=mes,
-                    ano=ano,
-                    valor=valor
-                )
-                db.session.add(novo_valor)
+        from services.persistencia import gravar_valores
         
-        db.session.commit()
+        valores = {int(conta_id): float(valor) for conta_id, valor in valores.items()}
+        
+        # Valores atuais do mês em uma consulta (para saber o que realmente mudou)
+        atuais = dict(db.session.query(ValorMensal.conta_id, ValorMensal.valor)
+                      .filter(ValorMensal.mes == mes, ValorMensal.ano == ano,
+                              ValorMensal.conta_id.in_(valores)).all())
+        
+        # Contas cujo valor realmente mudou (base do recálculo incremental)
+        contas_alteradas = {c for c, v in valores.items() if c not in atuais or atuais[c] != v}
         
-        # EXECUTAR OS CÁLCULOS
-        from services.calculadora import calcular_mes
-        total_calculadas = calcular_mes(int(mes), int(ano))
+        # Salvar todos os valores de entrada manual em um único upsert
+        # (sem commit: valores, marca de mês sujo e job vão no mesmo commit)
+        gravar_valores({(conta_id, mes, ano): valor for conta_id, valor in valores.items()}, commit=False)
+        
+        # AGENDAR OS CÁLCULOS (executados em segundo plano)
+        from services.fila_calculo import enfileirar_calculo
+        job_id = enfileirar_calculo(mes, ano, contas_alteradas)
+        if job_id is None:
+            db.session.commit()
         
         return jsonify({
             'success': True, 
-            'message': f'Dados salvos! {total_calculadas} contas calculadas automaticamente.'
+            'message': 'Dados salvos! Recálculo das contas agendado.' if job_id else 'Dados salvos! Nenhum valor alterado.',
+            'job_id': job_id
         })
     
     except Exception as e:
@@ -716,99 +659,118 @@ def api_gerar_template_excel():
 # ============================================
 
 @app.route('/api/dashboard/kpis/<int:mes>/<int:ano>')
+@condicional_periodo
+@em_cache(por_periodo=True)
 def api_dashboard_kpis(mes, ano):
     """Retorna os KPIs principais do mês"""
     try:
-        valores_db = ValorMensal.query.filter_by(mes=mes, ano=ano).all()
-        valores = {v.conta_id: v.valor for v in valores_db}
-        
-        kpis = {
-            'receita': valores.get(1, 0),
-            'resultado_operacional': valores.get(18, 0),
-            'ebitda': valores.get(21, 0),
-            'margem_contribuicao': valores.get(16, 0),
-            'liquidez_corrente': valores.get(84, 0),
-            'capital_circulante': valores.get(87, 0),
-        }
-        
-        return jsonify(kpis)
+        from services.dashboard import montar_kpis
+        
+        valores = obter_snapshot().valores_mes(mes, ano)
+        return jsonify(montar_kpis(valores))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/evolucao/<int:ano>')
+@em_cache()
 def api_dashboard_evolucao(ano):
     """Retorna dados de evolução mensal para gráficos de linha"""
+    from services.series import evolucao_mensal
+    
     try:
-        # Buscar dados dos últimos 12 meses
-        dados = {
-            'meses': [],
-            'receita': [],
-            'ebitda': [],
-            'resultado_operacional': [],
-            'margem_contribuicao': [],
-            'fluxo_caixa_livre': []
-        }
-        
-        for mes in range(1, 13):
-            valores_db = ValorMensal.query.filter_by(mes=mes, ano=ano).all()
-            valores = {v.conta_id: v.valor for v in valores_db}
-            
-            # Se não tem dados neste mês, pular
-            if not valores:
-                continue
-            
-            dados['meses'].append(f"{mes:02d}/{ano}")
-            dados['receita'].append(valores.get(1, 0))
-            dados['ebitda'].append(valores.get(21, 0))
-            dados['resultado_operacional'].append(valores.get(18, 0))
-            dados['margem_contribuicao'].append(valores.get(16, 0))
-            dados['fluxo_caixa_livre'].append(valores.get(28, 0))
-        
-        return jsonify(dados)
+        # Uma consulta só com as contas dos gráficos (Jan-Dez do ano)
+        recalcular_meses_sujos((1, ano), (12, ano))
+        return jsonify(evolucao_mensal((1, ano), (12, ano)))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/dashboard/evolucao')
+@em_cache()
+def api_dashboard_evolucao_janela():
+    """
+    Evolução mensal em janela móvel (pode atravessar anos)
+
+    Ex: /api/dashboard/evolucao?ultimos=24 -> últimos 24 meses até o último mês com dados
+        /api/dashboard/evolucao?ultimos=24&mes=6&ano=2025 -> 24 meses até 06/2025
+    """
+    from services.series import evolucao_mensal, ultimo_periodo_evolucao
+    from services.periodos import indice_periodo, periodo_do_indice
+    
+    try:
+        ultimos = request.args.get('ultimos', 12, type=int)
+        if ultimos < 1:
+            return jsonify({'error': 'ultimos deve ser maior que zero'}), 400
+        
+        mes = request.args.get('mes', type=int)
+        ano = request.args.get('ano', type=int)
+        if mes and ano:
+            fim = (mes, ano)
+        else:
+            # Banco vazio: janela terminando no fim do ano atual (sem dados)
+            fim = ultimo_periodo_evolucao() or (12, datetime.now().year)
+        
+        inicio = periodo_do_indice(indice_periodo(*fim) - ultimos + 1)
+        recalcular_meses_sujos(inicio, fim)
+        return jsonify(evolucao_mensal(inicio, fim))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/composicao/<int:mes>/<int:ano>')
+@condicional_periodo
+@em_cache(por_periodo=True)
 def api_dashboard_composicao(mes, ano):
     """Retorna dados de composição para gráficos de pizza"""
+    from services.dashboard import montar_composicao
+    
     try:
-        valores_db = ValorMensal.query.filter_by(mes=mes, ano=ano).all()
-        valores = {v.conta_id: v.valor for v in valores_db}
-        
-        composicao = {
-            'ativo': {
-                'labels': ['Disponível', 'Créditos', 'Estoques'],
-                'valores': [
-                    valores.get(37, 0),
-                    valores.get(45, 0),
-                    valores.get(51, 0)
-                ]
-            },
-            'passivo': {
-                'labels': ['Passivo Circulante', 'Passivo Não Circulante', 'Patrimônio Líquido'],
-                'valores': [
-                    valores.get(71, 0),
-                    valores.get(81, 0),
-                    valores.get(82, 0)
-                ]
-            }
-        }
-        
-        return jsonify(composicao)
+        valores = obter_snapshot().valores_mes(mes, ano)
+        return jsonify(montar_composicao(valores))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/ultimos-meses')
+@em_cache()
 def api_dashboard_ultimos_meses():
     """Retorna lista dos últimos meses com dados disponíveis"""
+    from services.dashboard import montar_ultimos_meses
+    
     try:
-        meses_disponiveis = db.session.query(
-            ValorMensal.mes,
-            ValorMensal.ano
-        ).distinct().order_by(ValorMensal.ano.desc(), ValorMensal.mes.desc()).limit(12).all()
-        
-        resultado = [{'mes': m, 'ano': a} for m, a in meses_disponiveis]
-        return jsonify(resultado)
+        return jsonify(montar_ultimos_meses(obter_indice_periodos().periodos))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/periodos')
+@em_cache()
+def api_periodos():
+    """
+    Meses com dados e a situação de cada um (fechado, calculado, sujo),
+    do mais recente para o mais antigo
+    """
+    try:
+        return jsonify(obter_indice_periodos().listar())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/dashboard/bundle')
+@em_cache()
+def api_dashboard_bundle():
+    """
+    Tudo o que o dashboard carrega na abertura em uma resposta:
+    anos disponíveis, últimos meses, KPIs, evolução, composição e séries históricas
+
+    Ex: /api/dashboard/bundle?mes=10&ano=2025
+    """
+    from services.dashboard import montar_bundle, ANO_INICIO_HISTORICO
+    
+    try:
+        mes = request.args.get('mes', type=int)
+        ano = request.args.get('ano', type=int)
+        if not mes or not ano:
+            return jsonify({'error': 'Informe mes e ano'}), 400
+        
+        # O bundle lê do mês escolhido (ou do início do histórico) em diante
+        recalcular_meses_sujos((1, min(ano, ANO_INICIO_HISTORICO)))
+        return jsonify(montar_bundle(mes, ano))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -858,8 +820,8 @@ def api_upload_nfe():
                     time.sleep(0.5)
         
         if resultado['sucesso']:
-            # Recalcular contas 93 e 94 para os meses importados
-            from services.calculadora import calcular_mes
+            # Agendar recálculo das contas 93 e 94 para os meses importados
+            from services.fila_calculo import enfileirar_calculo
             from models.nota_fiscal import NotaFiscal
             
             meses_anos = db.session.query(
@@ -867,13 +829,14 @@ def api_upload_nfe():
                 NotaFiscal.ano
             ).distinct().all()
             
-            for mes, ano in meses_anos:
-                calcular_mes(mes, ano)
+            # Só a conta 95 (Compras) muda com as notas
+            jobs = [enfileirar_calculo(mes, ano, {95}) for mes, ano in meses_anos]
             
             return jsonify({
                 'success': True,
                 'message': f"Importação concluída! {resultado['total_importado']} notas fiscais importadas.",
-                'detalhes': resultado
+                'detalhes': resultado,
+                'jobs': jobs
             })
         else:
             return jsonify({
@@ -884,6 +847,44 @@ def api_upload_nfe():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    """Retorna o status de um recálculo agendado"""
+    from models.job_calculo import JobCalculo
+    
+    job = db.session.get(JobCalculo, job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/cache')
+def api_cache():
+    """Estatísticas do cache de respostas (acertos, falhas, entradas) e do snapshot de valores"""
+    estatisticas = cache_respostas.estatisticas()
+    estatisticas['snapshot'] = obter_snapshot().estatisticas()
+    return jsonify(estatisticas)
+
+@app.route('/api/calculo/explain/<int:mes>/<int:ano>')
+def api_calculo_explain(mes, ano):
+    """
+    Calcula o mês sem gravar e retorna, para cada conta, as entradas lidas,
+    os valores intermediários e o tempo gasto (da conta mais cara para a mais barata)
+
+    ?motor=vetorial usa o motor em lote em vez do cálculo conta a conta
+    """
+    try:
+        motor = request.args.get('motor', 'celula')
+        if motor == 'vetorial':
+            from services.motor_vetorial import explicar_mes
+        elif motor == 'celula':
+            from services.calculadora import explicar_mes
+        else:
+            return jsonify({'error': f'Motor inválido: {motor}'}), 400
+
+        return jsonify(explicar_mes(mes, ano))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/nfe/resumo/<int:mes>/<int:ano>')
 def api_nfe_resumo(mes, ano):
     """Retorna resumo das NF-e de um mês"""
@@ -914,82 +915,60 @@ def api_nfe_resumo(mes, ano):
         return jsonify({'error': str(e)}), 500 
 
     
+@app.route('/api/evolucao-receita/ponto-equilibrio')
+@em_cache()
+def api_ponto_equilibrio():
+    """
+    Ponto de Equilíbrio mensal (variante I ou II) de um ou mais anos
+
+    Ex: /api/evolucao-receita/ponto-equilibrio?ano=2025&variante=II
+        /api/evolucao-receita/ponto-equilibrio?ano=2024,2025 (comparação entre anos)
+    """
+    from services.ponto_equilibrio import calcular_ponto_equilibrio, VARIANTES
+    
+    try:
+        variante = request.args.get('variante', 'I').upper()
+        if variante not in VARIANTES:
+            return jsonify({'error': 'Variante inválida (use I ou II)'}), 400
+        
+        try:
+            anos = [int(a) for a in request.args.get('ano', str(datetime.now().year)).split(',') if a.strip()]
+        except ValueError:
+            return jsonify({'error': 'Ano inválido'}), 400
+        if not anos:
+            return jsonify({'error': 'Informe o ano'}), 400
+        
+        recalcular_meses_sujos((1, min(anos)), (12, max(anos)))
+        dados = calcular_ponto_equilibrio(anos, variante)
+        return jsonify({
+            'variante': variante,
+            'anos': list(dados),
+            'dados': {str(ano): valores for ano, valores in dados.items()}
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/evolucao-receita/ponto-equilibrio-mensal-2025')
+@em_cache()
 def api_ponto_equilibrio_mensal_2025():
     """Calcula o Ponto de Equilíbrio I mensalmente para 2025"""
+    from services.ponto_equilibrio import calcular_ponto_equilibrio
+    
     try:
-        dados_meses = []
-        
-        # Loop de Janeiro (1) a Dezembro (12)
-        for mes in range(1, 13):
-            # Função auxiliar para buscar valor do mês específico
-            def get_val(conta_id):
-                val = db.session.query(ValorMensal.valor)\
-                    .filter_by(conta_id=conta_id, ano=2025, mes=mes).scalar()
-                return val or 0.0
-
-            receita = get_val(1)       # ID 1
-            custo_var = abs(get_val(15)) # ID 15 (Usamos abs para garantir razão positiva)
-            custo_fixo = abs(get_val(17)) # ID 17 (Usamos abs para o valor final ser positivo)
-
-            ponto_equilibrio = 0
-            
-            # Aplicação da fórmula: 17 / (1 - (15 / 1))
-            if receita > 0:
-                razao = custo_var / receita
-                # Margem não pode ser 0 ou negativa para o calculo fazer sentido
-                if razao < 1:
-                    margem = 1 - razao
-                    ponto_equilibrio = custo_fixo / margem
-            
-            dados_meses.append(ponto_equilibrio)
-
-        return jsonify({'dados': dados_meses})
-
+        recalcular_meses_sujos((1, 2025), (12, 2025))
+        return jsonify({'dados': calcular_ponto_equilibrio([2025], 'I')[2025]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500           
 
 @app.route('/api/evolucao-receita/ponto-equilibrio-ii-mensal-2025')
+@em_cache()
 def api_ponto_equilibrio_ii_mensal_2025():
     """Calcula o Ponto de Equilíbrio II (com Fluxo de Caixa DRE) para 2025"""
+    from services.ponto_equilibrio import calcular_ponto_equilibrio
+    
     try:
-        dados_meses = []
-        
-        for mes in range(1, 13):
-            # Função auxiliar para buscar valor
-            def get_val(conta_id):
-                val = db.session.query(ValorMensal.valor)\
-                    .filter_by(conta_id=conta_id, ano=2025, mes=mes).scalar()
-                # Usamos abs() para garantir que pegamos o valor positivo da despesa/saída
-                return abs(val) if val else 0.0
-
-            # 1. Componentes Básicos
-            receita = get_val(1)        # ID 1
-            custo_var = get_val(15)     # ID 15
-            custo_fixo = get_val(17)    # ID 17
-
-            # 2. Calcular o "Fluxo de Caixa DRE" (ID 102 Virtual)
-            # Soma dos IDs: 23, 24, 25, 26
-            fluxo_caixa_dre = get_val(23) + get_val(24) + get_val(25) + get_val(26)
-
-            ponto_equilibrio_ii = 0
-            
-            # 3. Fórmula: (17 + 102) / (1 - (15 / 1))
-            if receita > 0:
-                razao_custo = custo_var / receita
-                # A margem de contribuição (1 - razão) deve ser positiva
-                if razao_custo < 1:
-                    margem_contribuicao = 1 - razao_custo
-                    
-                    # O numerador agora é Custo Fixo + Fluxo de Caixa DRE
-                    total_a_cobrir = custo_fixo + fluxo_caixa_dre
-                    
-                    ponto_equilibrio_ii = total_a_cobrir / margem_contribuicao
-            
-            dados_meses.append(ponto_equilibrio_ii)
-
-        return jsonify({'dados': dados_meses})
-
+        recalcular_meses_sujos((1, 2025), (12, 2025))
+        return jsonify({'dados': calcular_ponto_equilibrio([2025], 'II')[2025]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -997,7 +976,7 @@ def api_ponto_equilibrio_ii_mensal_2025():
 @app.route('/api/integracao/sincronizar-omie', methods=['POST'])
 def api_sincronizar_omie():
     from services.omie_service import OmieService
-    from services.calculadora import Calculadora
+    from services.fila_calculo import enfileirar_calculo
     
     try:
         # Pega as datas enviadas pelo JSON
@@ -1013,10 +992,8 @@ def api_sincronizar_omie():
         # Passa as datas para o serviço
         resultado = service.sincronizar_por_periodo(data_inicio, data_fim)
         
-        # Recalcula o resto do sistema com base na data atual (opcional, mas bom para garantir)
-        agora = datetime.now()
-        calc = Calculadora(agora.month, agora.year)
-        calc.calcular_todas_contas()
+        # Agenda o recálculo do que depende da conta 95 nos meses sincronizados
+        resultado['jobs'] = [enfileirar_calculo(mes, ano, {95}) for mes, ano in resultado.get('meses', [])]
         
         return jsonify(resultado)
     except Exception as e:
@@ -1079,7 +1056,6 @@ def importar_nfe_manual():
 def api_lancar_nfe_manual():
     # Importações aqui dentro para evitar ERRO CIRCULAR
     from models.nota_fiscal import NotaFiscal
-    from models.valor_mensal import ValorMensal
     
     try:
         dados = request.json
@@ -1123,17 +1099,16 @@ def api_lancar_nfe_manual():
         mes = data_emissao.month
         ano = data_emissao.year
         
+        from services.persistencia import gravar_valores
         total = db.session.query(db.func.sum(NotaFiscal.valor))\
-            .filter(NotaFiscal.conta_id == 95, NotaFiscal.mes == mes, NotaFiscal.ano == ano)\
+            .filter(NotaFiscal.conta_id == 95, NotaFiscal.periodo == ano * 12 + mes - 1)\
             .scalar() or 0.0
             
-        registro = ValorMensal.query.filter_by(conta_id=95, mes=mes, ano=ano).first()
+        gravar_valores({(95, mes, ano): total}, commit=False)
         
-        if registro:
-            registro.valor = total
-        else:
-            novo_reg = ValorMensal(conta_id=95, mes=mes, ano=ano, valor=total)
-            db.session.add(novo_reg)
+        # Contas que dependem de Compras serão recalculadas na próxima leitura
+        from services.meses_sujos import marcar_mes_sujo
+        marcar_mes_sujo(mes, ano, {95})
             
         db.session.commit()
         
@@ -1144,6 +1119,42 @@ def api_lancar_nfe_manual():
         print(f"ERRO NO SERVIDOR: {e}") # Isso vai aparecer no seu terminal
         return jsonify({'error': str(e)}), 500    
 
+# ============================================
+# COMANDOS DE LINHA DE COMANDO (flask ...)
+# ============================================
+
+def _ler_mes_ano(texto):
+    """Converte 'AAAA-MM' em (mes, ano) para os comandos do CLI"""
+    from services.periodos import ler_periodo
+    try:
+        return ler_periodo(texto)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+@app.cli.command('recalcular')
+@click.option('--de', 'de', required=True, help='Mês inicial no formato AAAA-MM')
+@click.option('--ate', 'ate', required=True, help='Mês final no formato AAAA-MM')
+@click.option('--incluir-historico', is_flag=True, help='Recalcula também anos anteriores a 2025 (dados fixos)')
+def comando_recalcular(de, ate, incluir_historico):
+    """Recalcula todas as contas calculadas de um período"""
+    from services.recalculo import recalcular_historico
+    import time
+    
+    inicio = _ler_mes_ano(de)
+    fim = _ler_mes_ano(ate)
+    if (fim[1], fim[0]) < (inicio[1], inicio[0]):
+        raise click.BadParameter("--ate deve ser posterior a --de")
+    
+    print(f"🔢 Recalculando {de} a {ate}...")
+    t0 = time.perf_counter()
+    resultado = recalcular_historico(inicio, fim, incluir_historico=incluir_historico)
+    
+    if not incluir_historico and inicio[1] < 2025:
+        print("🔒 Anos anteriores a 2025 ignorados (use --incluir-historico para recalculá-los)")
+    
+    print(f"💾 {resultado['linhas']} valores gravados em {resultado['segundos_gravacao'] * 1000:.1f} ms")
+    print(f"✅ {len(resultado['meses'])} meses recalculados em {time.perf_counter() - t0:.2f} s")
+
 if __name__ == '__main__':
     with app.app_context():
         # Criar todas as tabelas
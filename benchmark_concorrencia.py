@@ -0,0 +1,193 @@
+"""
+Benchmark de concorrência no SQLite: N threads lendo endpoints do dashboard,
+distribuídas em vários processos (como workers do servidor), enquanto outro
+processo recalcula um mês (calcular_mes) sem parar
+
+Roda uma vez por perfil (services/perfil_sqlite.py), sempre sobre uma cópia
+do banco configurado (o original não é alterado).
+
+Uso: python benchmark_concorrencia.py [--leitores 8] [--processos 4] [--segundos 5] [--perfis padrao,producao]
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ENDPOINTS = [
+    '/api/valores/{mes}/{ano}',
+    '/api/dashboard/kpis/{mes}/{ano}',
+    '/api/dashboard/composicao/{mes}/{ano}',
+    '/api/dashboard/bundle?mes={mes}&ano={ano}',
+    '/api/periodos',
+    '/api/contas-balanco',
+]
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _preparar():
+    """Importa o app no processo filho e descobre o último mês com dados"""
+    from app import app
+    from models import db
+    from models.valor_mensal import ValorMensal
+
+    with app.app_context():
+        ultimo = db.session.query(db.func.max(ValorMensal.periodo)).scalar()
+    return app, ultimo % 12 + 1, ultimo // 12
+
+
+def _processo_leitor(threads, segundos, largada, fila):
+    """Um worker do servidor: `threads` leitores simultâneos nos endpoints"""
+    app, mes, ano = _preparar()
+    largada.wait()
+    fim = time.perf_counter() + segundos
+    latencias = []
+    erros = []
+    trava = threading.Lock()
+
+    def leitor(numero):
+        cliente = app.test_client()
+        proprias = []
+        i = numero
+        while time.perf_counter() < fim:
+            url = ENDPOINTS[i % len(ENDPOINTS)].format(mes=mes, ano=ano)
+            i += 1
+            inicio = time.perf_counter()
+            resposta = cliente.get(url)
+            proprias.append(time.perf_counter() - inicio)
+            if resposta.status_code != 200:
+                with trava:
+                    erros.append(resposta.get_data(as_text=True)[:120])
+        with trava:
+            latencias.extend(proprias)
+
+    lista = [threading.Thread(target=leitor, args=(n,)) for n in range(threads)]
+    for t in lista:
+        t.start()
+    for t in lista:
+        t.join()
+    fila.put(('leitura', latencias, erros))
+
+
+def _processo_escritor(segundos, largada, fila):
+    """Recalcula o último mês sem parar (cada cálculo é um commit)"""
+    app, mes, ano = _preparar()
+    from models import db
+    from services.calculadora import calcular_mes
+
+    largada.wait()
+    fim = time.perf_counter() + segundos
+    duracoes = []
+    erros = []
+    with app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                calcular_mes(mes, ano)
+                duracoes.append(time.perf_counter() - inicio)
+            except Exception as e:
+                db.session.rollback()
+                erros.append(f"escrita: {e}"[:120])
+    fila.put(('escrita', duracoes, erros))
+
+
+def executar(leitores, processos, segundos):
+    """
+    Roda o teste com o banco e o perfil do ambiente: `processos` workers
+    (cada um com leitores / processos threads) e um processo escritor
+    """
+    app, mes, ano = _preparar()
+    from services.perfil_sqlite import ler_pragmas
+
+    # Uma passada antes da medição: cria as tabelas/índices que são criados sob demanda
+    cliente = app.test_client()
+    for url in ENDPOINTS:
+        cliente.get(url.format(mes=mes, ano=ano))
+    with app.app_context():
+        pragmas = ler_pragmas(['journal_mode', 'synchronous', 'busy_timeout'])
+
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    largada = contexto.Barrier(processos + 1)
+    por_processo = [leitores // processos + (i < leitores % processos) for i in range(processos)]
+    filhos = [contexto.Process(target=_processo_leitor, args=(n, segundos, largada, fila))
+              for n in por_processo]
+    filhos.append(contexto.Process(target=_processo_escritor, args=(segundos, largada, fila)))
+    for filho in filhos:
+        filho.start()
+
+    latencias, escritas, erros = [], [], []
+    for _ in filhos:
+        tipo, tempos, falhas = fila.get()
+        (latencias if tipo == 'leitura' else escritas).extend(tempos)
+        erros.extend(falhas)
+    for filho in filhos:
+        filho.join()
+
+    travados = sum('locked' in e for e in erros)
+    print(f"   PRAGMAs: {pragmas}")
+    print(f"   Leituras: {len(latencias)} ({len(latencias) / segundos:.0f}/s) | "
+          f"p50 {percentil(latencias, 0.5) * 1000:.1f} ms | p95 {percentil(latencias, 0.95) * 1000:.1f} ms | "
+          f"máx {max(latencias, default=0) * 1000:.1f} ms")
+    print(f"   Recálculos de {mes:02d}/{ano}: {len(escritas)} | "
+          f"médio {sum(escritas) / len(escritas) * 1000 if escritas else 0:.1f} ms")
+    print(f"   Erros: {len(erros)} (database is locked: {travados})")
+    for erro in erros[:3]:
+        print(f"     {erro}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leitores', type=int, default=8)
+    parser.add_argument('--processos', type=int, default=4)
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--perfis', default='padrao,producao')
+    parser.add_argument('--executar', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.executar:
+        executar(args.leitores, max(1, min(args.processos, args.leitores)), args.segundos)
+        return
+
+    from config import Config
+    if not Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite:///'):
+        print("❌ Benchmark dos perfis do SQLite (DATABASE_URL aponta para outro banco)")
+        sys.exit(2)
+    origem = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '', 1)
+    print(f"🧪 {args.leitores} leitores em {args.processos} processos + 1 escritor "
+          f"por {args.segundos:.0f}s | banco: {origem}")
+
+    for perfil in args.perfis.split(','):
+        with tempfile.TemporaryDirectory() as pasta:
+            copia = os.path.join(pasta, 'financeiro.db')
+            shutil.copy(origem, copia)
+            ambiente = dict(
+                os.environ,
+                DATABASE_URL=f'sqlite:///{copia}',
+                SQLITE_PERFIL=perfil,
+                # Sem cache de respostas: toda leitura chega ao banco/snapshot
+                CACHE_RESPOSTAS_ATIVO='0',
+            )
+            print(f"\n📊 Perfil '{perfil}'")
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--executar', '--leitores', str(args.leitores),
+                 '--processos', str(args.processos), '--segundos', str(args.segundos)],
+                env=ambiente, check=False
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: avaliação de fórmulas antiga (regex + eval) x compilada
+Usa o plano de contas e os valores reais de um mês do banco (somente leitura)
+"""
+
+import re
+import sys
+import timeit
+from app import app, db
+from models.conta import Conta
+from models.valor_mensal import ValorMensal
+from services.formulas import compilar_formula, invalidar_cache
+
+
+def formula_legada(formula, valores):
+    """Cópia do caminho antigo da Calculadora._calcular_formula, mantida só para comparação"""
+    tokens = re.findall(r'\d+\.?\d*|\+|\-|\*|\/|\(|\)', str(formula))
+    nova_formula = []
+    for token in tokens:
+        if token.isdigit():
+            nova_formula.append(str(valores.get(int(token), 0.0)))
+        else:
+            nova_formula.append(token)
+    try:
+        resultado = eval(' '.join(nova_formula))
+        return float(resultado) if resultado else 0.0
+    except ZeroDivisionError:
+        return 0.0
+
+
+def formula_compilada(formula, valores):
+    try:
+        return compilar_formula(formula).avaliar(valores)
+    except ZeroDivisionError:
+        return 0.0
+
+
+def main(mes=10, ano=2025, repeticoes=2000):
+    with app.app_context():
+        contas = Conta.query.filter_by(entrada_manual=False).order_by(Conta.id).all()
+        formulas = [c.formula for c in contas if c.formula and not c.formula.startswith('ACUMULADO')]
+        valores = {v.conta_id: v.valor for v in ValorMensal.query.filter_by(mes=mes, ano=ano).all()}
+
+    print(f"📐 {len(formulas)} fórmulas | valores de {mes:02d}/{ano} | {repeticoes} repetições")
+
+    # Conferência: os dois caminhos precisam dar o mesmo resultado
+    for formula in formulas:
+        antigo = formula_legada(formula, valores)
+        novo = formula_compilada(formula, valores)
+        if abs(antigo - novo) > 1e-6 * max(1.0, abs(antigo)):
+            print(f"❌ Divergência em '{formula}': {antigo} x {novo}")
+            sys.exit(1)
+
+    def rodar(avaliador):
+        for formula in formulas:
+            avaliador(formula, valores)
+
+    invalidar_cache()
+    t_antigo = timeit.timeit(lambda: rodar(formula_legada), number=repeticoes)
+    t_novo = timeit.timeit(lambda: rodar(formula_compilada), number=repeticoes)
+
+    por_mes_antigo = t_antigo / repeticoes * 1e6
+    por_mes_novo = t_novo / repeticoes * 1e6
+    print(f"   regex + eval : {por_mes_antigo:10.1f} µs por mês")
+    print(f"   compilada    : {por_mes_novo:10.1f} µs por mês")
+    print(f"   ganho        : {t_antigo / t_novo:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
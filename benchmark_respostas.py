@@ -0,0 +1,54 @@
+"""
+Benchmark: serialização JSON (json padrão x orjson) e bytes trafegados
+(sem compressão x gzip x brotli) nos endpoints de histórico multi-ano
+Usa o banco configurado apenas para leitura
+"""
+
+import gzip
+import timeit
+from flask.json.provider import DefaultJSONProvider
+from app import app
+from services.cache_respostas import cache_respostas
+from services.respostas import ProvedorJSONRapido, orjson, brotli, comprimir
+
+ENDPOINTS = [
+    '/api/series?contas=1,37,101,97,84,85,18,52,87&de=2022',
+    '/api/dashboard/bundle?mes=10&ano=2025',
+    '/api/dashboard/ebitda-historico',
+    '/api/evolucao-receita/receita-mensal-historico',
+    '/api/evolucao-receita/receita-acumulada-historico',
+    '/api/dashboard/evolucao?ultimos=36',
+]
+
+
+def main(repeticoes=500):
+    padrao = DefaultJSONProvider(app)
+    rapido = ProvedorJSONRapido(app) if orjson is not None else None
+    cache_respostas.ativo = False
+    cliente = app.test_client()
+
+    print(f"🧪 {repeticoes} repetições por endpoint | orjson: {'sim' if orjson else 'não'} | brotli: {'sim' if brotli else 'não'}")
+    print(f"{'endpoint':58} {'json µs':>9} {'orjson µs':>10} {'bytes':>8} {'gzip':>7} {'br':>7}")
+
+    for url in ENDPOINTS:
+        resposta = cliente.get(url)
+        if resposta.status_code != 200:
+            print(f"❌ {url}: status {resposta.status_code}")
+            continue
+        payload = resposta.get_json()
+
+        t_padrao = timeit.timeit(lambda: padrao.dumps(payload), number=repeticoes) / repeticoes * 1e6
+        t_rapido = None
+        if rapido is not None:
+            t_rapido = timeit.timeit(lambda: rapido.dumps(payload), number=repeticoes) / repeticoes * 1e6
+
+        corpo = padrao.dumps(payload).encode()
+        tamanho_gzip = len(gzip.compress(corpo, compresslevel=6))
+        tamanho_br = len(comprimir(corpo, 'br')) if brotli is not None else None
+
+        print(f"{url[:58]:58} {t_padrao:9.1f} {t_rapido if t_rapido is not None else float('nan'):10.1f} "
+              f"{len(corpo):8d} {tamanho_gzip:7d} {tamanho_br if tamanho_br is not None else '-':>7}")
+
+
+if __name__ == '__main__':
+    main()
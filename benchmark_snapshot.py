@@ -0,0 +1,64 @@
+"""
+Benchmark: leituras do dashboard consultando o SQLite x lendo do
+snapshot em memória (services/snapshot_valores.py)
+Usa o banco configurado apenas para leitura
+"""
+
+import timeit
+from app import app
+from models import db
+from models.valor_mensal import ValorMensal
+from services.snapshot_valores import SnapshotValores, obter_snapshot
+from services.series import CONTAS_EVOLUCAO
+
+CONTAS_SERIES = [1, 37, 101, 97, 84, 85, 18, 52, 87]
+
+
+def consulta_mes(mes, ano):
+    return {v.conta_id: v.valor for v in ValorMensal.query.filter_by(mes=mes, ano=ano).all()}
+
+
+def consulta_series(contas, ano_de):
+    return db.session.query(
+        ValorMensal.conta_id, ValorMensal.ano, ValorMensal.mes, ValorMensal.valor
+    ).filter(ValorMensal.conta_id.in_(contas), ValorMensal.ano >= ano_de).all()
+
+
+def medir(funcao, repeticoes):
+    return timeit.timeit(funcao, number=repeticoes) / repeticoes * 1e6
+
+
+def main(repeticoes=300):
+    with app.app_context():
+        ultimo = db.session.query(db.func.max(ValorMensal.periodo)).scalar()
+        if ultimo is None:
+            print("❌ Banco sem valores mensais")
+            return
+        mes, ano = ultimo % 12 + 1, ultimo // 12
+
+        t_carga = medir(SnapshotValores.carregar, 10)
+        snapshot = obter_snapshot()
+        print(f"🧪 {snapshot.estatisticas()['linhas']} linhas | carga do snapshot: {t_carga / 1000:.1f} ms "
+              f"| {snapshot.estatisticas()['bytes'] / 1024:.0f} KiB")
+        print(f"{'leitura':32} {'SQLite µs':>10} {'snapshot µs':>12}")
+
+        casos = [
+            (f'valores do mês {mes:02d}/{ano}',
+             lambda: consulta_mes(mes, ano),
+             lambda: obter_snapshot().valores_mes(mes, ano)),
+            ('séries (9 contas, desde 2022)',
+             lambda: consulta_series(CONTAS_SERIES, 2022),
+             lambda: obter_snapshot().registros(CONTAS_SERIES, 2022)),
+            (f'evolução {ano}',
+             lambda: consulta_series(list(CONTAS_EVOLUCAO.values()), ano),
+             lambda: obter_snapshot().registros(CONTAS_EVOLUCAO.values(), ano, ano)),
+            (f'matrizes ponto equilíbrio {ano}',
+             lambda: consulta_series([1, 15, 17, 23, 24, 25, 26], ano),
+             lambda: obter_snapshot().matrizes([ano], [1, 15, 17, 23, 24, 25, 26])),
+        ]
+        for nome, banco, memoria in casos:
+            print(f"{nome:32} {medir(banco, repeticoes):10.1f} {medir(memoria, repeticoes):12.1f}")
+
+
+if __name__ == '__main__':
+    main()
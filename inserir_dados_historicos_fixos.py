@@ -3,19 +3,8 @@ Script para inserir DADOS HISTÓRICOS FIXOS (2022, 2023, 2024)
 Estes dados NÃO serão recalculados pela calculadora.py
 """
 
-from app import app, db
-from models.valor_mensal import ValorMensal
-
-def inserir_ou_atualizar(conta_id, mes, ano, valor):
-    """Insere ou atualiza um valor no banco"""
-    existe = ValorMensal.query.filter_by(conta_id=conta_id, mes=mes, ano=ano).first()
-    if existe:
-        existe.valor = valor
-        return "atualizado"
-    else:
-        novo = ValorMensal(conta_id=conta_id, mes=mes, ano=ano, valor=valor)
-        db.session.add(novo)
-        return "criado"
+from app import app
+from services.persistencia import gravar_valores
 
 def main():
     app.app_context().push()
@@ -26,7 +15,8 @@ def main():
     print("⚠️  Estes dados NÃO serão recalculados pela calculadora.py")
     print()
     
-    total_inserido = 0
+    # {(conta_id, mes, ano): valor}, gravados de uma vez no final
+    valores = {}
     
     # =========================================================================
     # ID 37 - TOTAL DISPONÍVEL (2023, 2024)
@@ -41,9 +31,8 @@ def main():
     ]
     
     for mes, valor in dados_37_2023:
-        status = inserir_ou_atualizar(37, mes, 2023, valor)
-        print(f"  ✅ 2023/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(37, mes, 2023)] = valor
+        print(f"  ✅ 2023/{mes:02d}: R$ {valor:,.2f}")
     
     # 2024
     dados_37_2024 = [
@@ -53,9 +42,8 @@ def main():
     ]
     
     for mes, valor in dados_37_2024:
-        status = inserir_ou_atualizar(37, mes, 2024, valor)
-        print(f"  ✅ 2024/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(37, mes, 2024)] = valor
+        print(f"  ✅ 2024/{mes:02d}: R$ {valor:,.2f}")
     
     print()
     
@@ -72,9 +60,8 @@ def main():
     ]
     
     for mes, valor in dados_1_2022:
-        status = inserir_ou_atualizar(1, mes, 2022, valor)
-        print(f"  ✅ 2022/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(1, mes, 2022)] = valor
+        print(f"  ✅ 2022/{mes:02d}: R$ {valor:,.2f}")
     
     # 2023
     dados_1_2023 = [
@@ -84,9 +71,8 @@ def main():
     ]
     
     for mes, valor in dados_1_2023:
-        status = inserir_ou_atualizar(1, mes, 2023, valor)
-        print(f"  ✅ 2023/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(1, mes, 2023)] = valor
+        print(f"  ✅ 2023/{mes:02d}: R$ {valor:,.2f}")
     
     # 2024
     dados_1_2024 = [
@@ -96,9 +82,8 @@ def main():
     ]
     
     for mes, valor in dados_1_2024:
-        status = inserir_ou_atualizar(1, mes, 2024, valor)
-        print(f"  ✅ 2024/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(1, mes, 2024)] = valor
+        print(f"  ✅ 2024/{mes:02d}: R$ {valor:,.2f}")
     
     print()
     
@@ -124,9 +109,8 @@ def main():
     ]
     
     for mes, valor in dados_101_2022:
-        status = inserir_ou_atualizar(101, mes, 2022, valor)
-        print(f"  ✅ 2022/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(101, mes, 2022)] = valor
+        print(f"  ✅ 2022/{mes:02d}: R$ {valor:,.2f}")
     
     # 2023 - Acumulado mês a mês
     dados_101_2023 = [
@@ -145,9 +129,8 @@ def main():
     ]
     
     for mes, valor in dados_101_2023:
-        status = inserir_ou_atualizar(101, mes, 2023, valor)
-        print(f"  ✅ 2023/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(101, mes, 2023)] = valor
+        print(f"  ✅ 2023/{mes:02d}: R$ {valor:,.2f}")
     
     # 2024 - Acumulado mês a mês
     dados_101_2024 = [
@@ -166,9 +149,8 @@ def main():
     ]
     
     for mes, valor in dados_101_2024:
-        status = inserir_ou_atualizar(101, mes, 2024, valor)
-        print(f"  ✅ 2024/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(101, mes, 2024)] = valor
+        print(f"  ✅ 2024/{mes:02d}: R$ {valor:,.2f}")
     
     print()
     
@@ -194,16 +176,15 @@ def main():
     ]
     
     for mes, valor in dados_52_2024:
-        status = inserir_ou_atualizar(52, mes, 2024, valor)
-        print(f"  ✅ 2024/{mes:02d}: R$ {valor:,.2f} ({status})")
-        total_inserido += 1
+        valores[(52, mes, 2024)] = valor
+        print(f"  ✅ 2024/{mes:02d}: R$ {valor:,.2f}")
     
     print()
-    # COMMIT FINAL
-    db.session.commit()
+    # Um único upsert em lote, com commit
+    resultado = gravar_valores(valores, commit=True)
     
     print("=" * 70)
-    print(f"✅ CONCLUÍDO! Total de {total_inserido} valores inseridos/atualizados")
+    print(f"✅ CONCLUÍDO! Total de {resultado['linhas']} valores inseridos/atualizados")
     print("=" * 70)
     print()
     print("🔒 Estes dados estão PROTEGIDOS e não serão recalculados.")
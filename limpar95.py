@@ -1,6 +1,7 @@
 from app import app, db
 from models.nota_fiscal import NotaFiscal
 from models.valor_mensal import ValorMensal
+from services.versao_dados import marcar_periodos_alterados
 
 def limpar_tudo():
     print("🧹 Iniciando limpeza de dados de Compras (Notas e Conta 95)...")
@@ -14,6 +15,7 @@ def limpar_tudo():
             # 2. Apagar os valores mensais da conta 95 (Compras)
             # Assim, quando você subir a planilha, ele vai criar do zero
             num_valores = db.session.query(ValorMensal).filter_by(conta_id=95).delete()
+            marcar_periodos_alterados(db.session, {None})
             print(f"   🗑️  {num_valores} registros mensais da conta 95 removidos.")
 
             db.session.commit()
@@ -1,6 +1,7 @@
 from app import app, db
 from models.valor_mensal import ValorMensal
 from models.nota_fiscal import NotaFiscal
+from services.versao_dados import marcar_periodos_alterados
 
 def limpar_dados_mes():
     print("\n🧹 --- FERRAMENTA DE LIMPEZA DE DADOS ---")
@@ -18,6 +19,7 @@ def limpar_dados_mes():
         with app.app_context():
             # 1. Remove Valores Mensais (DRE, Balanço, Cálculos)
             num_valores = ValorMensal.query.filter_by(mes=mes, ano=ano).delete()
+            marcar_periodos_alterados(db.session, {(mes, ano)})
             
             # 2. Remove Notas Fiscais (se houver)
             num_nfe = NotaFiscal.query.filter_by(mes=mes, ano=ano).delete()
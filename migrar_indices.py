@@ -0,0 +1,88 @@
+"""
+Migração: coluna periodo e índices de valores_mensais e notas_fiscais
+
+1. Cria a coluna periodo (ano * 12 + mes - 1), gerada pelo banco
+2. Cria as tabelas versoes_dados (versão dos dados, ver services/versao_dados.py),
+   meses_sujos e jobs_calculo (fila de recálculo)
+3. Remove os índices antigos, substituídos pelos de periodo
+4. Cria os índices definidos nos modelos (ver verificar_indices.py)
+5. Atualiza as estatísticas do otimizador (ANALYZE)
+
+O índice único (conta_id, ano, mes) fica com migrar_valores_unicos.py,
+que precisa remover as duplicadas antes. Pode ser executado mais de uma vez.
+"""
+
+from config import Config
+
+# O app confere o esquema ao iniciar: quem o atualiza é esta migração
+Config.VERIFICAR_ESQUEMA = False
+
+from app import app, db
+from sqlalchemy import text
+from models.valor_mensal import ValorMensal
+from models.nota_fiscal import NotaFiscal
+from models.mes_sujo import MesSujo
+from models.job_calculo import JobCalculo
+from services.persistencia import INDICE_UNICO, adicionar_coluna_periodo
+from services.versao_dados import criar_tabela_versoes
+
+INDICES_ANTIGOS = [
+    'idx_conta_mes_ano', 'idx_valores_ano_mes_atualizacao',
+    # (ano, mes) -> periodo
+    'idx_valores_ano_mes', 'idx_valores_conta_ano', 'idx_notas_conta_ano_mes',
+]
+
+
+def migrar():
+    print("🛠️ Atualizando índices de valores_mensais e notas_fiscais...")
+
+    with app.app_context():
+        try:
+            conexao = db.session.connection()
+
+            # ETAPA 1: Coluna periodo
+            print("1️⃣ Criando coluna periodo...")
+            for tabela in (ValorMensal.__table__, NotaFiscal.__table__):
+                criada = adicionar_coluna_periodo(conexao, tabela)
+                print(f"   ✅ {tabela.name}" + ("" if criada else " (já existia)"))
+
+            # ETAPA 2: Tabelas de controle (versões, meses sujos, fila de cálculo)
+            print("2️⃣ Criando tabelas de controle...")
+            criar_tabela_versoes(conexao)
+            print("   ✅ versoes_dados")
+            for tabela in (MesSujo.__table__, JobCalculo.__table__):
+                tabela.create(conexao, checkfirst=True)
+                print(f"   ✅ {tabela.name}")
+
+            # ETAPA 3: Remover índices substituídos
+            print("3️⃣ Removendo índices antigos...")
+            for nome in INDICES_ANTIGOS:
+                conexao.execute(text(f"DROP INDEX IF EXISTS {nome}"))
+                print(f"   ✅ {nome}")
+
+            # ETAPA 4: Criar os índices dos modelos
+            print("4️⃣ Criando índices novos...")
+            for tabela in (ValorMensal.__table__, NotaFiscal.__table__):
+                for indice in sorted(tabela.indexes, key=lambda i: i.name):
+                    if indice.name == INDICE_UNICO:
+                        continue
+                    indice.create(conexao, checkfirst=True)
+                    colunas = ', '.join(c.name for c in indice.columns)
+                    print(f"   ✅ {indice.name} ({tabela.name}: {colunas})")
+
+            # ETAPA 5: Estatísticas para o otimizador escolher os índices
+            print("5️⃣ Atualizando estatísticas (ANALYZE)...")
+            conexao.execute(text("ANALYZE"))
+            db.session.commit()
+            print("   ✅ Estatísticas atualizadas!")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"   ❌ Erro na migração: {e}")
+            return
+
+    print("🏁 Processo finalizado.")
+
+
+if __name__ == "__main__":
+    migrar()
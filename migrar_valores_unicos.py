@@ -0,0 +1,75 @@
+"""
+Migração: um único valor por (conta_id, ano, mes) em valores_mensais
+
+1. Remove as linhas duplicadas, mantendo a atualizada por último
+   (maior data_atualizacao; sem data ou empate = maior id)
+2. Cria o índice único usado pelo INSERT ... ON CONFLICT de gravar_valores
+
+Pode ser executado mais de uma vez.
+"""
+
+from config import Config
+
+# O app confere o esquema ao iniciar: quem o atualiza é esta migração
+Config.VERIFICAR_ESQUEMA = False
+
+from app import app, db
+from sqlalchemy import bindparam, text
+from services.persistencia import INDICE_UNICO
+from services.versao_dados import criar_tabela_versoes, marcar_periodos_alterados
+
+SQL_DUPLICADAS = """
+    SELECT id, mes, ano FROM (
+        SELECT id, mes, ano, ROW_NUMBER() OVER (
+            PARTITION BY conta_id, ano, mes
+            ORDER BY data_atualizacao IS NULL, data_atualizacao DESC, id DESC
+        ) AS ordem
+        FROM valores_mensais
+    ) AS numeradas
+    WHERE ordem > 1
+"""
+
+
+def migrar():
+    print("🛠️ Migrando valores_mensais para um valor por conta/mês...")
+
+    with app.app_context():
+        try:
+            # ETAPA 1: Remover duplicadas
+            print("1️⃣ Procurando linhas duplicadas...")
+            duplicadas = db.session.execute(text(SQL_DUPLICADAS)).all()
+            if duplicadas:
+                ids = [d.id for d in duplicadas]
+                for i in range(0, len(ids), 500):
+                    db.session.execute(
+                        text("DELETE FROM valores_mensais WHERE id IN :ids")
+                        .bindparams(bindparam('ids', expanding=True)),
+                        {'ids': ids[i:i + 500]}
+                    )
+                # A versão dos meses sobe no commit (tabela de versões pode não existir ainda)
+                criar_tabela_versoes(db.session.connection())
+                marcar_periodos_alterados(db.session, {(d.mes, d.ano) for d in duplicadas})
+                print(f"   ✅ {len(ids)} linhas duplicadas removidas "
+                      f"em {len({(d.mes, d.ano) for d in duplicadas})} meses")
+            else:
+                print("   ⚠️ Nenhuma duplicada encontrada. Pulando etapa.")
+
+            # ETAPA 2: Índice único (alvo do ON CONFLICT)
+            print("2️⃣ Criando índice único (conta_id, ano, mes)...")
+            db.session.execute(text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {INDICE_UNICO} "
+                "ON valores_mensais (conta_id, ano, mes)"
+            ))
+            db.session.commit()
+            print("   ✅ Índice criado com sucesso!")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"   ❌ Erro na migração: {e}")
+            return
+
+    print("🏁 Processo finalizado.")
+
+
+if __name__ == "__main__":
+    migrar()
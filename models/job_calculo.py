@@ -0,0 +1,48 @@
+from models import db
+from datetime import datetime
+
+class JobCalculo(db.Model):
+    """Modelo da tabela JobsCalculo - Fila de recálculos executados em segundo plano"""
+    
+    __tablename__ = 'jobs_calculo'
+    
+    # Colunas da tabela
+    id = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.Integer, nullable=False)
+    ano = db.Column(db.Integer, nullable=False)
+    contas_alteradas = db.Column(db.String(500), nullable=True)  # "1,23,95" ou vazio = recálculo completo
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, executando, concluido, erro
+    total_calculadas = db.Column(db.Integer, nullable=True)
+    mensagem = db.Column(db.String(500), nullable=True)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_inicio = db.Column(db.DateTime, nullable=True)
+    data_fim = db.Column(db.DateTime, nullable=True)
+    
+    # Índice para localizar rapidamente jobs pendentes de um mês
+    __table_args__ = (
+        db.Index('idx_jobs_status_mes_ano', 'status', 'mes', 'ano'),
+    )
+    
+    def __repr__(self):
+        return f'<JobCalculo {self.id}: {self.mes}/{self.ano} {self.status}>'
+    
+    def obter_contas(self):
+        """Retorna o conjunto de contas alteradas (None = recálculo completo)"""
+        if not self.contas_alteradas:
+            return None
+        return {int(c) for c in self.contas_alteradas.split(',')}
+    
+    def to_dict(self):
+        """Converte o objeto em dicionário"""
+        return {
+            'id': self.id,
+            'mes': self.mes,
+            'ano': self.ano,
+            'contas_alteradas': sorted(self.obter_contas()) if self.contas_alteradas else None,
+            'status': self.status,
+            'total_calculadas': self.total_calculadas,
+            'mensagem': self.mensagem,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
+            'data_inicio': self.data_inicio.isoformat() if self.data_inicio else None,
+            'data_fim': self.data_fim.isoformat() if self.data_fim else None
+        }
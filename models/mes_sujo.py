@@ -0,0 +1,31 @@
+from models import db
+from datetime import datetime
+
+class MesSujo(db.Model):
+    """Modelo da tabela MesesSujos - Meses com contas calculadas desatualizadas"""
+    
+    __tablename__ = 'meses_sujos'
+    
+    # Colunas da tabela
+    mes = db.Column(db.Integer, primary_key=True)
+    ano = db.Column(db.Integer, primary_key=True)
+    contas_alteradas = db.Column(db.String(500), nullable=True)  # "1,23,95" ou vazio = recálculo completo
+    data_marcacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<MesSujo {self.mes}/{self.ano}>'
+    
+    def obter_contas(self):
+        """Retorna o conjunto de contas alteradas (None = recálculo completo)"""
+        if not self.contas_alteradas:
+            return None
+        return {int(c) for c in self.contas_alteradas.split(',')}
+    
+    def to_dict(self):
+        """Converte o objeto em dicionário"""
+        return {
+            'mes': self.mes,
+            'ano': self.ano,
+            'contas_alteradas': sorted(self.obter_contas()) if self.contas_alteradas else None,
+            'data_marcacao': self.data_marcacao.isoformat() if self.data_marcacao else None
+        }
@@ -1,4 +1,4 @@
-from app import db
+from models import db
 
 class NotaFiscal(db.Model):
     __tablename__ = 'notas_fiscais'
@@ -15,6 +15,8 @@ class NotaFiscal(db.Model):
     
     mes = db.Column(db.Integer)
     ano = db.Column(db.Integer)
+    # Índice do período (ano * 12 + mes - 1), calculado pelo banco
+    periodo = db.Column(db.Integer, db.Computed('ano * 12 + mes - 1', persisted=True))
     
     conta_id = db.Column(db.Integer, db.ForeignKey('contas.id'))
     categoria = db.Column(db.String(100))
@@ -22,5 +24,10 @@ class NotaFiscal(db.Model):
     # Campo para saber de qual empresa veio (Empo, Papello, RAO)
     empresa = db.Column(db.String(50)) 
 
+    # Total mensal da conta 95 (soma de valor por conta/mês) lido só do índice
+    __table_args__ = (
+        db.Index('idx_notas_conta_periodo', 'conta_id', 'periodo', 'valor'),
+    )
+
     def __repr__(self):
         return f'<NotaFiscal {self.numero} - R$ {self.valor}>'
\ No newline at end of file
@@ -11,13 +11,22 @@ class ValorMensal(db.Model):
     conta_id = db.Column(db.Integer, db.ForeignKey('contas.id'), nullable=False)
     mes = db.Column(db.Integer, nullable=False)  # 1 a 12
     ano = db.Column(db.Integer, nullable=False)
+    # Índice do período (ano * 12 + mes - 1), calculado pelo próprio banco a cada
+    # escrita: intervalos que cruzam anos viram um único BETWEEN
+    periodo = db.Column(db.Integer, db.Computed('ano * 12 + mes - 1', persisted=True))
     valor = db.Column(db.Float, default=0.0)
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
     data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Índice para melhorar performance nas consultas
+    # Índices escolhidos pelos planos de consulta (ver verificar_indices.py);
+    # os dois primeiros cobrem as consultas: o SQLite não precisa ler a tabela
     __table_args__ = (
-        db.Index('idx_conta_mes_ano', 'conta_id', 'mes', 'ano'),
+        # Mês inteiro / intervalo de meses: cálculo do mês, motor vetorial
+        db.Index('idx_valores_periodo', 'periodo', 'conta_id', 'valor', 'data_atualizacao'),
+        # Histórico por conta: séries acumuladas (IDs 27/28, 1/101)
+        db.Index('idx_valores_conta_periodo', 'conta_id', 'periodo', 'valor'),
+        # Um valor por conta e mês: é o alvo do ON CONFLICT de gravar_valores
+        db.Index('uq_valores_conta_ano_mes', 'conta_id', 'ano', 'mes', unique=True),
     )
     
     def __repr__(self):
@@ -0,0 +1,14 @@
+from models import db
+
+class VersaoDados(db.Model):
+    """Modelo da tabela VersoesDados - Contadores de alteração dos valores mensais"""
+    
+    __tablename__ = 'versoes_dados'
+    
+    # Colunas da tabela
+    # Índice do mês (ano * 12 + mes - 1); linhas especiais: -1 = global, -2 = todos os meses
+    periodo = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<VersaoDados {self.periodo}: {self.versao}>'
@@ -0,0 +1,117 @@
+import numpy as np
+from models import db
+from models.valor_mensal import ValorMensal
+
+# Contas acumuladas e a conta que alimenta cada uma
+CONTA_ACUMULADO = 28          # FLUXO DE CAIXA LIVRE = 28 (mês anterior) + 27
+CONTA_FLUXO_CAIXA = 27
+CONTA_ACUMULADO_ANUAL = 101   # Receita Acumulada Anual = soma do ID 1 no ano
+CONTA_RECEITA = 1
+
+
+# ============================================
+# SOMAS PREFIXADAS (NumPy)
+# ============================================
+
+def soma_com_reinicio(incrementos, reinicio, base):
+    """
+    Soma corrida em uma passada, reiniciando nas posições marcadas
+
+    Em cada posição com reinicio=True (e na primeira posição) o resultado é
+    base[i]; nas demais é o resultado anterior + incrementos[i].
+    """
+    incrementos = np.where(reinicio, 0.0, incrementos)
+    soma = np.cumsum(incrementos)
+    posicoes = np.arange(len(incrementos))
+    ultimo_reinicio = np.maximum.accumulate(np.where(reinicio, posicoes, 0))
+    return base[ultimo_reinicio] + soma - soma[ultimo_reinicio]
+
+
+def soma_anual(valores, meses):
+    """Soma corrida de janeiro até cada mês, reiniciando a cada ano"""
+    valores = np.asarray(valores, dtype=float)
+    return soma_com_reinicio(valores, np.asarray(meses) == 1, valores)
+
+
+# ============================================
+# PROPAGAÇÃO A PARTIR DE UM MÊS
+# ============================================
+
+def serie_acumulado(mes, ano, fluxo_mes, valores_fixos, ano_minimo):
+    """
+    Calcula o ID 28 do mês informado e de todos os meses seguintes já
+    calculados (com ID 27 ou 28 gravado), numa única consulta
+
+    Args:
+        fluxo_mes: valor do ID 27 no mês (ainda não gravado)
+        valores_fixos: dict {(conta_id, mes, ano): valor} de exceções
+
+    Returns:
+        dict: {(mes, ano): valor}
+    """
+    inicio = ano * 12 + mes - 1
+    # Do mês anterior (contexto) em diante
+    registros = db.session.query(
+        ValorMensal.conta_id, ValorMensal.periodo, ValorMensal.valor
+    ).filter(
+        ValorMensal.conta_id.in_([CONTA_FLUXO_CAIXA, CONTA_ACUMULADO]),
+        ValorMensal.periodo >= inicio - 1
+    ).all()
+
+    fluxo = {}
+    acumulado = {}
+    for conta_id, indice, valor in registros:
+        destino = fluxo if conta_id == CONTA_FLUXO_CAIXA else acumulado
+        destino[indice] = valor or 0.0
+    fluxo[inicio] = fluxo_mes
+
+    # Linha do tempo contínua: mês anterior (contexto) até o último mês calculado
+    calculados = set(fluxo) | set(acumulado)
+    fim = max(i for i in calculados if i >= inicio)
+    linha = np.arange(inicio - 1, fim + 1)
+    calcular = np.array([i >= inicio and i in calculados and i // 12 >= ano_minimo for i in linha])
+    fixos = np.array([valores_fixos.get((CONTA_ACUMULADO, i % 12 + 1, i // 12)) for i in linha], dtype=object)
+    tem_fixo = np.array([f is not None for f in fixos])
+
+    # Meses fora do cálculo valem o que está gravado (ou 0.0), como na leitura do mês anterior
+    base = np.array([
+        fixos[k] if tem_fixo[k] else acumulado.get(i, 0.0)
+        for k, i in enumerate(linha)
+    ], dtype=float)
+    incrementos = np.array([fluxo.get(i, 0.0) for i in linha])
+
+    resultado = soma_com_reinicio(incrementos, ~calcular | tem_fixo, base)
+    return {
+        (i % 12 + 1, i // 12): float(resultado[k])
+        for k, i in enumerate(linha.tolist()) if calcular[k]
+    }
+
+
+def serie_acumulado_anual(mes, ano, receita_mes):
+    """
+    Calcula o ID 101 do mês informado e dos meses seguintes do mesmo ano
+    que tenham receita (ID 1) ou o próprio acumulado gravados, numa única consulta
+
+    Returns:
+        dict: {(mes, ano): valor}
+    """
+    registros = db.session.query(ValorMensal.conta_id, ValorMensal.mes, ValorMensal.valor).filter(
+        ValorMensal.conta_id.in_([CONTA_RECEITA, CONTA_ACUMULADO_ANUAL]),
+        ValorMensal.periodo.between(ano * 12, ano * 12 + 11)
+    ).all()
+
+    receita = np.zeros(12)
+    com_dados = np.zeros(12, dtype=bool)
+    for conta_id, m, valor in registros:
+        if 1 <= m <= 12:
+            if conta_id == CONTA_RECEITA:
+                receita[m - 1] = valor or 0.0
+            com_dados[m - 1] = True
+    receita[mes - 1] = receita_mes
+    com_dados[mes - 1] = True
+
+    acumulado = np.cumsum(receita)
+    return {
+        (m, ano): float(acumulado[m - 1])
+        for m in range(mes, 13) if com_dados[m - 1]
+    }
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import g, request, make_response, Response
+from services.versao_dados import versao_dados, versao_periodo
+
+
+class CacheRespostas:
+    """
+    Cache LRU das respostas JSON das APIs de leitura
+
+    A chave inclui a versão dos dados: depois de uma escrita a versão muda
+    e as entradas antigas deixam de ser encontradas (e saem pelo LRU).
+    """
+
+    def __init__(self, limite=512):
+        self.limite = limite
+        self.ativo = True
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.falhas += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return entrada
+
+    def guardar(self, chave, entrada):
+        with self._trava:
+            self._entradas[chave] = entrada
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.limite:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+            self.acertos = 0
+            self.falhas = 0
+
+    def estatisticas(self):
+        with self._trava:
+            total = self.acertos + self.falhas
+            return {
+                'ativo': self.ativo,
+                'entradas': len(self._entradas),
+                'limite': self.limite,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / total, 4) if total else 0.0,
+                'versao_dados': versao_dados()
+            }
+
+
+cache_respostas = CacheRespostas()
+
+
+def iniciar_cache(app):
+    """Aplica as configurações CACHE_RESPOSTAS_* do app"""
+    cache_respostas.limite = app.config.get('CACHE_RESPOSTAS_LIMITE', 512)
+    cache_respostas.ativo = app.config.get('CACHE_RESPOSTAS_ATIVO', True)
+
+
+def _versao_do_mes(mes, ano):
+    """Versão do mês, reaproveitando a já lida por condicional_periodo nesta requisição"""
+    lida = g.get('versao_periodo')
+    if lida is not None and lida[:2] == (mes, ano):
+        return lida[2]
+    return versao_periodo(mes, ano)
+
+
+def em_cache(por_periodo=False):
+    """
+    Decorador de rota: guarda a resposta (status 200) por rota + parâmetros + versão
+
+    por_periodo=True usa a versão do (mes, ano) da URL, então alterar um mês
+    não invalida os demais. As outras rotas usam a versão global.
+    As versões vêm do banco (ver services/versao_dados.py): escritas de
+    outro processo (ex: 'flask recalcular') também invalidam as entradas.
+    A chave leva também o mês corrente: rotas que dependem da data de hoje
+    (ex: 'fechado' em /api/periodos, ano padrão) mudam na virada do mês.
+    """
+    def decorador(view):
+        @wraps(view)
+        def envoltorio(*args, **kwargs):
+            if not cache_respostas.ativo:
+                return view(*args, **kwargs)
+
+            if por_periodo:
+                versao = ('periodo', _versao_do_mes(kwargs['mes'], kwargs['ano']))
+            else:
+                versao = ('global', versao_dados())
+            chave = (request.path, tuple(sorted(request.args.items(multi=True))), versao,
+                     datetime.now().strftime('%Y-%m'))
+
+            entrada = cache_respostas.obter(chave)
+            if entrada is not None:
+                corpo, mimetype = entrada
+                return Response(corpo, mimetype=mimetype)
+
+            resposta = make_response(view(*args, **kwargs))
+            if resposta.status_code == 200:
+                cache_respostas.guardar(chave, (resposta.get_data(), resposta.mimetype))
+            return resposta
+        return envoltorio
+    return decorador
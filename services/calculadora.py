@@ -1,54 +1,96 @@
+import time
 from models import db
-from models.conta import Conta
 from models.valor_mensal import ValorMensal
-import re
+from services.formulas import compilar_formula, obter_grafo, dependencias_da_formula, FormulaInvalida
+from services.persistencia import gravar_valores
+from services.acumulados import (
+    serie_acumulado, serie_acumulado_anual,
+    CONTA_ACUMULADO, CONTA_ACUMULADO_ANUAL, CONTA_FLUXO_CAIXA, CONTA_RECEITA
+)
+
+# --- Valores Fixos para Jan-Abr/2025 (IDs 27 e 28) ---
+# Chave: (conta_id, mes, ano)
+VALORES_FIXOS = {
+    # FLUXO DE CAIXA
+    (27, 1, 2025): -808491.83,
+    (27, 2, 2025): -97556.96,
+    (27, 3, 2025): -135813.53,
+    (27, 4, 2025): -128647.21,
+    # FLUXO DE CAIXA LIVRE (ACUMULADO)
+    (28, 1, 2025): -418423.17,
+    (28, 2, 2025): -515980.13,
+    (28, 3, 2025): -605324.75,
+    (28, 4, 2025): -733971.96,
+}
+# -----------------------------------------------------
+
+# Anos anteriores são históricos/fixos e não são recalculados
+ANO_MINIMO_CALCULO = 2025
 
 class Calculadora:
     """Classe responsável por calcular todas as fórmulas das contas"""
     
-    def __init__(self, mes, ano):
+    def __init__(self, mes, ano, propagar=True, rastrear=False):
         self.mes = mes
         self.ano = ano
+        # Atualizar também os meses seguintes das contas acumuladas
+        self.propagar = propagar
         self.valores_cache = {}
+        self.resultados = {}
+        self.gravacao = None
+        # Modo explain: entradas, intermediários e tempos de cada conta
+        self.rastro = [] if rastrear else None
+        self.tempos = {}
+        self._tempo_banco = 0.0
         
-    def calcular_todas_contas(self):
-        """Calcula todas as contas com fórmulas para o mês/ano"""
+    def calcular_todas_contas(self, contas_alteradas=None, commit=True, gravar=True):
+        """
+        Calcula as contas com fórmulas para o mês/ano
+
+        Se contas_alteradas for informado (conjunto de IDs), recalcula apenas
+        as contas que dependem delas, direta ou indiretamente. Os resultados
+        são gravados em lote no final; com commit=False a transação fica
+        aberta para o chamador (lote de vários meses). gravar=False só
+        calcula (explain): os resultados ficam em self.resultados.
+        """
         
         # --- TRAVA DE SEGURANÇA ---
         # Impede recálculo de anos anteriores a 2025 para proteger dados históricos
-        if self.ano < 2025:
+        if self.ano < ANO_MINIMO_CALCULO:
             print(f"🔒 Ano {self.ano} é histórico/fixo. Cálculos automáticos ignorados.")
             return 0
         # --------------------------
 
-        print(f"\n🔢 Iniciando cálculos para {self.mes}/{self.ano}...")
-        
-        # Buscar todas as contas que têm fórmulas (entrada_manual = False)
-        contas_calculadas = Conta.query.filter_by(entrada_manual=False).order_by(Conta.id).all()
+        grafo = obter_grafo()
+        if contas_alteradas is None:
+            print(f"\n🔢 Iniciando cálculos para {self.mes}/{self.ano}...")
+            # Contas com fórmulas (entrada_manual = False) em ordem de dependência
+            contas_calculadas = grafo.ordem
+        else:
+            # Recálculo incremental: só o que está a jusante das contas alteradas
+            contas_calculadas = grafo.afetadas(contas_alteradas)
+            print(f"\n🔢 Recálculo incremental {self.mes}/{self.ano}: "
+                  f"{len(contas_calculadas)} contas afetadas por {sorted(contas_alteradas)}")
+            if not contas_calculadas:
+                return 0
         
         # Cache dos valores de entrada manual
+        inicio = time.perf_counter()
         self._carregar_valores_cache()
+        self.tempos['carga'] = time.perf_counter() - inicio
         
         # Calcular cada conta
         
         total_calculadas = 0
+        inicio = time.perf_counter()
         for conta in contas_calculadas:
             try:
                 resultado = None
+                inicio_conta = time.perf_counter()
+                self._tempo_banco = 0.0
 
-                # --- NOVO: Valores Fixos para Jan-Abr/2025 (IDs 27 e 28) ---
-                if self.ano == 2025:
-                    if conta.id == 27: # FLUXO DE CAIXA
-                        if self.mes == 1: resultado = -808491.83
-                        elif self.mes == 2: resultado = -97556.96
-                        elif self.mes == 3: resultado = -135813.53
-                        elif self.mes == 4: resultado = -128647.21
-                    elif conta.id == 28: # FLUXO DE CAIXA LIVRE (ACUMULADO)
-                        if self.mes == 1: resultado = -418423.17
-                        elif self.mes == 2: resultado = -515980.13
-                        elif self.mes == 3: resultado = -605324.75
-                        elif self.mes == 4: resultado = -733971.96
-                # -----------------------------------------------------------
+                # Valores Fixos para Jan-Abr/2025 (IDs 27 e 28)
+                resultado = VALORES_FIXOS.get((conta.id, self.mes, self.ano))
 
                 # Se não foi definido acima (resultado é None), calcula normalmente
                 if resultado is None:
@@ -58,6 +100,9 @@ class Calculadora:
                         resultado = self._calcular_acumulado_anual(conta.id)    
                     else:
                         resultado = self._calcular_formula(conta.formula)
+
+                if self.rastro is not None:
+                    self._registrar_rastro(conta, resultado, time.perf_counter() - inicio_conta)
                 
                 # Salvar resultado
                 self._salvar_valor(conta.id, resultado)
@@ -68,158 +113,161 @@ class Calculadora:
             except Exception as e:
                 print(f"❌ Erro ao calcular ID {conta.id} ({conta.nome}): {str(e)}")
         
+        self.tempos['calculo'] = time.perf_counter() - inicio
+        
+        if not gravar:
+            return total_calculadas
+        
+        # Gravar tudo de uma vez
+        self.gravacao = gravar_valores(self.resultados, commit=commit)
+        self.tempos['gravacao'] = self.gravacao['segundos']
+        print(f"💾 {self.gravacao['linhas']} valores gravados em {self.gravacao['segundos'] * 1000:.1f} ms")
+        
         print(f"\n✅ Total de contas calculadas: {total_calculadas}")
         return total_calculadas
     
     def _carregar_valores_cache(self):
         """Carrega todos os valores do mês/ano em cache"""
-        valores = ValorMensal.query.filter_by(mes=self.mes, ano=self.ano).all()
-        for valor in valores:
-            self.valores_cache[valor.conta_id] = valor.valor
+        valores = db.session.query(ValorMensal.conta_id, ValorMensal.valor)\
+            .filter(ValorMensal.periodo == self.ano * 12 + self.mes - 1).all()
+        for conta_id, valor in valores:
+            self.valores_cache[conta_id] = valor
     
     def _obter_valor(self, conta_id):
         """Obtém o valor de uma conta do cache"""
         return self.valores_cache.get(conta_id, 0.0)
     
     def _calcular_formula(self, formula):
-        """Calcula uma fórmula matemática substituindo IDs por valores"""
+        """Calcula uma fórmula matemática usando a versão compilada (em cache)"""
         if not formula:
             return 0.0
         
         try:
-            # Abordagem: split por operadores, substituir tokens inteiros, rejuntar
-            import re
-            
-            # Preservar a fórmula original
-            formula_original = str(formula)
-            
-            # Dividir a fórmula em tokens (números e operadores)
-            # Match: números (inteiros ou decimais) ou operadores
-            tokens = re.findall(r'\d+\.?\d*|\+|\-|\*|\/|\(|\)', formula_original)
-            
-            # Criar dicionário de substituições
-            substituicoes = {}
-            for token in tokens:
-                # Se o token é um número inteiro (sem ponto decimal)
-                if token.isdigit():
-                    conta_id = int(token)
-                    # Buscar valor da conta
-                    valor = self._obter_valor(conta_id)
-                    substituicoes[token] = str(valor)
-            
-            # Reconstruir fórmula substituindo apenas tokens completos
-            nova_formula = []
-            for token in tokens:
-                if token in substituicoes:
-                    nova_formula.append(substituicoes[token])
-                else:
-                    nova_formula.append(token)
-            
-            # Juntar com espaços para clareza
-            formula_calculavel = ' '.join(nova_formula)
-            
-            # Avaliar
-            resultado = eval(formula_calculavel)
-            return float(resultado) if resultado else 0.0
+            return compilar_formula(formula).avaliar(self.valores_cache)
             
         except ZeroDivisionError:
             print(f"⚠️ Divisão por zero na fórmula: {formula}")
             return 0.0
-        except SyntaxError as e:
+        except FormulaInvalida as e:
             print(f"⚠️ Erro de sintaxe na fórmula '{formula}'")
-            print(f"   DEBUG: {formula_calculavel}")
+            print(f"   DEBUG: {str(e)}")
             return 0.0
         except Exception as e:
             print(f"⚠️ Erro ao calcular fórmula '{formula}': {type(e).__name__}: {str(e)}")
             return 0.0
     
     def _calcular_acumulado(self, conta_id):
-        """Calcula o valor acumulado (ex: Fluxo de Caixa Livre)"""
-        # Para ID 28 (FLUXO DE CAIXA LIVRE)
-        # Fórmula: 28(mês anterior) + 27(mês atual)
-        
-        if conta_id == 28:
-            # --- NOVO: Regra de Exceção para Saldo Inicial (Jan/2025) ---
-            if self.mes == 1 and self.ano == 2025:
-                return -418423.17
-            # -----------------------------------------------------------
-
-            # Buscar valor do mês anterior
-            mes_anterior = self.mes - 1
-            ano_anterior = self.ano
-            
-            if mes_anterior == 0:
-                mes_anterior = 12
-                ano_anterior -= 1
-            
-            valor_mes_anterior = ValorMensal.query.filter_by(
-                conta_id=28,
-                mes=mes_anterior,
-                ano=ano_anterior
-            ).first()
-            
-            acumulado_anterior = valor_mes_anterior.valor if valor_mes_anterior else 0.0
-            
-            # Buscar valor do ID 27 (FLUXO CAIXA) do mês atual
-            fluxo_caixa_atual = self._obter_valor(27)
-            
-            # Retornar acumulado
-            return acumulado_anterior + fluxo_caixa_atual
+        """
+        Calcula o valor acumulado (ex: Fluxo de Caixa Livre)
+
+        Para ID 28: 28(mês anterior) + 27(mês atual), calculado como soma
+        corrida que também atualiza os meses seguintes já calculados.
+        """
+        if conta_id == CONTA_ACUMULADO:
+            inicio = time.perf_counter()
+            serie = serie_acumulado(
+                self.mes, self.ano, self._obter_valor(CONTA_FLUXO_CAIXA),
+                VALORES_FIXOS, ANO_MINIMO_CALCULO
+            )
+            self._tempo_banco += time.perf_counter() - inicio
+            return self._registrar_serie(conta_id, serie)
         
         return 0.0
+
     def _calcular_acumulado_anual(self, conta_id):
         """
         Calcula o acumulado anual (soma de janeiro até o mês atual)
         Usado para: ID 101 - Receita Acumulada Anual
         Fórmula: Soma de ID 1 (Receita Operacional) de Jan até mês atual
         """
-        
-        if conta_id == 101:  # Receita Acumulada Anual
-            acumulado = 0.0
-            
-            # Somar receita de janeiro até o mês atual
-            for mes_iter in range(1, self.mes + 1):
-                # Buscar receita operacional (ID 1) do mês
-                receita = ValorMensal.query.filter_by(
-                    conta_id=1,
-                    mes=mes_iter,
-                    ano=self.ano
-                ).first()
-                
-                if receita:
-                    acumulado += receita.valor
-            
-            return acumulado
+        if conta_id == CONTA_ACUMULADO_ANUAL:
+            inicio = time.perf_counter()
+            serie = serie_acumulado_anual(self.mes, self.ano, self._obter_valor(CONTA_RECEITA))
+            self._tempo_banco += time.perf_counter() - inicio
+            return self._registrar_serie(conta_id, serie)
         
         return 0.0
+
+    def _registrar_serie(self, conta_id, serie):
+        """Guarda os meses seguintes de uma série acumulada e retorna o valor do mês"""
+        if self.propagar:
+            for (mes, ano), valor in serie.items():
+                if (mes, ano) != (self.mes, self.ano):
+                    self.resultados[(conta_id, mes, ano)] = valor
+            if len(serie) > 1:
+                print(f"↪️ ID {conta_id}: {len(serie) - 1} meses seguintes atualizados")
+        return serie[(self.mes, self.ano)]
+
+    def _registrar_rastro(self, conta, resultado, segundos):
+        """
+        Guarda o rastro de uma conta para o explain
+
+        O tempo de banco é o das consultas das séries acumuladas; o resto
+        do tempo da conta conta como avaliação.
+        """
+        item = {
+            'conta_id': conta.id,
+            'nome': conta.nome,
+            'formula': conta.formula,
+            'resultado': resultado,
+            'entradas': {},
+            'intermediarios': [],
+            'erro': None,
+            'valor_fixo': (conta.id, self.mes, self.ano) in VALORES_FIXOS,
+            'tempo_calculo_ms': (segundos - self._tempo_banco) * 1000,
+            'tempo_banco_ms': self._tempo_banco * 1000,
+            'custo_ms': segundos * 1000
+        }
+
+        self.rastro.append(item)
+        if item['valor_fixo'] or not conta.formula:
+            return
+
+        if conta.formula in ("ACUMULADO", "ACUMULADO_ANUAL"):
+            item['entradas'] = {c: self._obter_valor(c) for c in sorted(dependencias_da_formula(conta.formula))}
+            return
+
+        try:
+            # Reavalia fora da medição de tempo para coletar os intermediários
+            detalhe = compilar_formula(conta.formula).avaliar_com_rastro(self.valores_cache)
+            item['entradas'] = detalhe['entradas']
+            item['intermediarios'] = detalhe['intermediarios']
+            item['erro'] = detalhe['erro']
+        except FormulaInvalida as e:
+            item['erro'] = f'Fórmula inválida: {e}'
+
     def _salvar_valor(self, conta_id, valor):
-        """Salva o valor calculado no banco de dados"""
-        # Verificar se já existe
-        valor_existente = ValorMensal.query.filter_by(
-            conta_id=conta_id,
-            mes=self.mes,
-            ano=self.ano
-        ).first()
-        
-        if valor_existente:
-            valor_existente.valor = valor
-        else:
-            novo_valor = ValorMensal(
-                conta_id=conta_id,
-                mes=self.mes,
-                ano=self.ano,
-                valor=valor
-            )
-            db.session.add(novo_valor)
+        """Guarda o valor calculado para a gravação em lote no fim do cálculo"""
+        self.resultados[(conta_id, self.mes, self.ano)] = valor
         
         # Atualizar cache
         self.valores_cache[conta_id] = valor
-        
-        # Commit
-        db.session.commit()
 
 
-def calcular_mes(mes, ano):
-    """Função auxiliar para calcular um mês específico"""
+def calcular_mes(mes, ano, contas_alteradas=None):
+    """Função auxiliar para calcular um mês específico (ou só o afetado por contas_alteradas)"""
     calculadora = Calculadora(mes, ano)
-    return calculadora.calcular_todas_contas()
\ No newline at end of file
+    return calculadora.calcular_todas_contas(contas_alteradas)
+
+
+def explicar_mes(mes, ano):
+    """
+    Executa o cálculo completo do mês em modo rastreado, sem gravar nada
+
+    Só lê o banco (não abre escrita nem desfaz a sessão do chamador);
+    os meses seguintes dos acumulados não são tocados.
+
+    Returns:
+        dict: tempos das etapas e o rastro das contas, da mais cara para a mais barata
+    """
+    calculadora = Calculadora(mes, ano, propagar=False, rastrear=True)
+    total = calculadora.calcular_todas_contas(gravar=False)
+
+    return {
+        'mes': mes,
+        'ano': ano,
+        'motor': 'celula',
+        'total_calculadas': total,
+        'tempos_ms': {etapa: segundos * 1000 for etapa, segundos in calculadora.tempos.items()},
+        'contas': sorted(calculadora.rastro or [], key=lambda item: item['custo_ms'], reverse=True)
+    }
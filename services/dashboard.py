@@ -0,0 +1,98 @@
+from datetime import datetime
+from services.snapshot_valores import obter_snapshot
+from services.indice_periodos import obter_indice_periodos
+from services.series import (
+    montar_series, montar_evolucao, anos_historico, MESES_ABREV, CONTAS_EVOLUCAO
+)
+
+# Contas dos cartões de KPI
+CONTAS_KPIS = {
+    'receita': 1,
+    'resultado_operacional': 18,
+    'ebitda': 21,
+    'margem_contribuicao': 16,
+    'liquidez_corrente': 84,
+    'capital_circulante': 87,
+}
+
+# Contas das pizzas de composição
+COMPOSICAO = {
+    'ativo': [('Disponível', 37), ('Créditos', 45), ('Estoques', 51)],
+    'passivo': [('Passivo Circulante', 71), ('Passivo Não Circulante', 81), ('Patrimônio Líquido', 82)],
+}
+
+# Gráficos históricos do dashboard: 97 = EBITDA %, 84 = Liquidez Corrente,
+# 85 = Liquidez Seca, 18 = Resultado Operacional, 52 = Ativo Circulante,
+# 87 = Capital Circulante (a página filtra os anos de cada gráfico)
+CONTAS_HISTORICO = [97, 84, 85, 18, 52, 87]
+ANO_INICIO_HISTORICO = 2023
+
+
+def montar_kpis(valores):
+    """KPIs do mês a partir de {conta_id: valor}"""
+    return {chave: valores.get(conta_id, 0) for chave, conta_id in CONTAS_KPIS.items()}
+
+
+def montar_composicao(valores):
+    """Composição do ativo/passivo do mês a partir de {conta_id: valor}"""
+    return {
+        grupo: {
+            'labels': [rotulo for rotulo, _ in itens],
+            'valores': [valores.get(conta_id, 0) for _, conta_id in itens]
+        }
+        for grupo, itens in COMPOSICAO.items()
+    }
+
+
+def montar_anos_disponiveis(anos):
+    """Anos a partir de 2022 (ou o ano atual, se não houver dados)"""
+    anos = sorted(a for a in set(anos) if a >= 2022)
+    return anos or [datetime.now().year]
+
+
+def montar_ultimos_meses(periodos, limite=12):
+    """Últimos meses com dados ([(mes, ano)] do mais recente para o mais antigo)"""
+    return [{'mes': m, 'ano': a} for m, a in periodos[:limite]]
+
+
+def montar_bundle(mes, ano):
+    """
+    Tudo o que o dashboard carrega na abertura, lido do snapshot em memória:
+    os meses com dados (anos disponíveis / últimos meses) e os valores de
+    todas as contas usadas pelos cartões e gráficos
+
+    Returns:
+        dict: anos_disponiveis, ultimos_meses, kpis, evolucao, composicao e series
+              (cada seção no mesmo formato da rota individual)
+    """
+    snapshot = obter_snapshot()
+    indice = obter_indice_periodos()
+
+    contas = set(CONTAS_KPIS.values()) | set(CONTAS_EVOLUCAO.values()) | set(CONTAS_HISTORICO)
+    contas.update(conta_id for itens in COMPOSICAO.values() for _, conta_id in itens)
+    registros = snapshot.registros(contas, ano_de=min(ano, ANO_INICIO_HISTORICO))
+
+    valores_mes = {c: v for c, a, m, v in registros if (m, a) == (mes, ano)}
+    # Anos dos gráficos: com dados em qualquer conta (como as rotas *-historico)
+    historico = montar_series(
+        [r for r in registros if r[1] >= ANO_INICIO_HISTORICO], CONTAS_HISTORICO,
+        anos_historico(ANO_INICIO_HISTORICO)
+    )
+
+    return {
+        'mes': mes,
+        'ano': ano,
+        'anos_disponiveis': montar_anos_disponiveis(indice.anos()),
+        'ultimos_meses': montar_ultimos_meses(indice.periodos),
+        'kpis': montar_kpis(valores_mes),
+        'evolucao': montar_evolucao(registros, (1, ano), (12, ano), indice.linhas),
+        'composicao': montar_composicao(valores_mes),
+        'series': {
+            'meses': MESES_ABREV,
+            'anos': historico['anos'],
+            'series': {
+                str(conta_id): {str(a): valores for a, valores in por_ano.items()}
+                for conta_id, por_ano in historico['series'].items()
+            }
+        }
+    }
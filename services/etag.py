@@ -0,0 +1,43 @@
+from functools import wraps
+from flask import g, request, make_response, Response
+from services.versao_dados import versao_periodo
+
+
+def condicional_periodo(view):
+    """
+    Decorador de rota com (mes, ano) na URL: responde ETag e devolve 304
+    quando o navegador já tem a versão atual do mês, sem executar a rota
+    nem serializar o JSON
+
+    O ETag é a versão do mês (services/versao_dados.py), a mesma que chaveia
+    o cache de respostas e recarrega o snapshot; como é lida antes do corpo,
+    nunca é mais nova que ele. Sem Last-Modified: a data HTTP só tem segundos
+    e duas escritas no mesmo segundo ficariam com a mesma data.
+    O mês sujo é recalculado antes, para o ETag refletir os valores finais.
+    Recálculo e versão acontecem uma vez por requisição: a versão fica em
+    g.versao_periodo para em_cache e a rota não recalcula de novo.
+    """
+    @wraps(view)
+    def envoltorio(*args, **kwargs):
+        from services.meses_sujos import recalcular_se_sujo
+
+        mes, ano = kwargs['mes'], kwargs['ano']
+        recalcular_se_sujo(mes, ano)
+
+        versao = versao_periodo(mes, ano)
+        g.versao_periodo = (mes, ano, versao)
+        etag = f"{ano}-{mes:02d}-v{versao}"
+
+        if request.if_none_match.contains_weak(etag):
+            resposta = Response(status=304)
+        else:
+            resposta = make_response(view(*args, **kwargs))
+            if resposta.status_code != 200:
+                return resposta
+
+        # Fraco: a mesma versão pode ir comprimida ou não
+        resposta.set_etag(etag, weak=True)
+        # O navegador guarda a resposta, mas confirma a versão a cada uso
+        resposta.cache_control.no_cache = True
+        return resposta
+    return envoltorio
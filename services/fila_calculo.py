@@ -0,0 +1,164 @@
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db
+from models.job_calculo import JobCalculo
+from services.meses_sujos import marcar_mes_sujo, recalcular_se_sujo
+
+# Trava para enfileirar jobs e iniciar o worker sem corrida dentro do processo
+_trava = threading.Lock()
+# Acorda o worker quando um job novo chega
+_sinal = threading.Event()
+_worker = None
+
+# Job em 'executando' há mais tempo que isto é considerado abandonado
+# (processo encerrado no meio do cálculo) e volta para 'pendente'
+LIMITE_EXECUCAO = timedelta(minutes=10)
+# Busca por jobs abandonados: quando o worker inicia e depois a cada intervalo
+INTERVALO_RECUPERACAO = LIMITE_EXECUCAO
+
+
+def enfileirar_calculo(mes, ano, contas_alteradas=None):
+    """
+    Agenda o recálculo de um mês e retorna o ID do job
+
+    O mês também é marcado como sujo: se alguém ler o mês antes do job
+    rodar, a leitura recalcula e o job encontra o mês já em dia.
+    Se já existe um job pendente para o mesmo mês, os dois são unidos
+    (as contas alteradas se somam; recálculo completo prevalece).
+    contas_alteradas vazio (nenhuma mudança) não gera job e retorna None.
+    """
+    if contas_alteradas is not None and not contas_alteradas:
+        return None
+
+    with _trava:
+        job = JobCalculo.query.filter_by(status='pendente', mes=mes, ano=ano)\
+            .order_by(JobCalculo.id).first()
+
+        unidos = 0
+        if job:
+            atuais = job.obter_contas()
+            if atuais is None or contas_alteradas is None:
+                contas = None
+            else:
+                contas = _serializar(atuais | set(contas_alteradas))
+            # Update condicional: outro processo pode ter reservado (ou unido)
+            # o job depois da leitura; nesse caso vai um job novo
+            unidos = JobCalculo.query.filter_by(
+                id=job.id, status='pendente', contas_alteradas=job.contas_alteradas
+            ).update({'contas_alteradas': contas}, synchronize_session=False)
+
+        if not unidos:
+            job = JobCalculo(
+                mes=mes,
+                ano=ano,
+                contas_alteradas=_serializar(contas_alteradas),
+                status='pendente'
+            )
+            db.session.add(job)
+
+        marcar_mes_sujo(mes, ano, contas_alteradas)
+        db.session.commit()
+        job_id = job.id
+
+    _garantir_worker(current_app._get_current_object())
+    _sinal.set()
+    return job_id
+
+
+def _serializar(contas):
+    if contas is None:
+        return None
+    return ','.join(str(c) for c in sorted(contas))
+
+
+def _garantir_worker(app):
+    """Inicia a thread do worker na primeira vez que um job é agendado"""
+    global _worker
+    with _trava:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=_executar_fila, args=(app,), name='fila-calculo', daemon=True)
+        _worker.start()
+
+
+def _executar_fila(app):
+    """Laço do worker: executa os jobs pendentes em ordem de chegada"""
+    print("🧵 Worker da fila de cálculo iniciado")
+    proxima_recuperacao = 0.0
+    while True:
+        # Timeout também pega jobs criados por outros processos
+        _sinal.wait(timeout=5)
+        _sinal.clear()
+
+        with app.app_context():
+            try:
+                if time.monotonic() >= proxima_recuperacao:
+                    _recuperar_abandonados()
+                    proxima_recuperacao = time.monotonic() + INTERVALO_RECUPERACAO.total_seconds()
+                while True:
+                    job_id = _reservar_proximo()
+                    if job_id is None:
+                        break
+                    _executar_job(job_id)
+            finally:
+                db.session.remove()
+
+
+def _recuperar_abandonados():
+    """
+    Devolve para a fila os jobs presos em 'executando' além de LIMITE_EXECUCAO
+
+    Recalcular de novo é seguro: o job só refaz o que ainda estiver
+    marcado como sujo.
+    """
+    limite = datetime.utcnow() - LIMITE_EXECUCAO
+    recuperados = JobCalculo.query.filter(
+        JobCalculo.status == 'executando', JobCalculo.data_inicio < limite
+    ).update({'status': 'pendente', 'data_inicio': None}, synchronize_session=False)
+    if not recuperados:
+        # Nada a devolver: encerra a transação sem commit (nenhuma escrita no banco)
+        db.session.rollback()
+        return
+    db.session.commit()
+    print(f"♻️ {recuperados} job(s) abandonado(s) voltaram para a fila")
+
+
+def _reservar_proximo():
+    """Marca o próximo job pendente como 'executando' e retorna seu ID"""
+    # Sem a _trava: quem enfileira a segura já com a escrita aberta no banco.
+    # O update condicional basta (outro processo pode ter reservado o mesmo job)
+    while True:
+        job = JobCalculo.query.filter_by(status='pendente').order_by(JobCalculo.id).first()
+        if job is None:
+            return None
+
+        reservados = JobCalculo.query.filter_by(id=job.id, status='pendente').update({
+            'status': 'executando',
+            'data_inicio': datetime.utcnow()
+        })
+        db.session.commit()
+        if reservados:
+            return job.id
+
+
+def _executar_job(job_id):
+    job = db.session.get(JobCalculo, job_id)
+    try:
+        # As contas a recalcular vêm da marca de mês sujo (que acumula todas as alterações)
+        total = recalcular_se_sujo(job.mes, job.ano)
+        job.status = 'concluido'
+        job.total_calculadas = total
+        job.mensagem = f'{total} contas calculadas'
+    except Exception as e:
+        db.session.rollback()
+        traceback.print_exc()
+        job = db.session.get(JobCalculo, job_id)
+        job.status = 'erro'
+        job.mensagem = str(e)[:500]
+
+    job.data_fim = datetime.utcnow()
+    db.session.commit()
+    print(f"📋 Job {job.id} ({job.mes}/{job.ano}): {job.status}")
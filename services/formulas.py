@@ -0,0 +1,314 @@
+import heapq
+import operator
+import re
+from collections import namedtuple
+from sqlalchemy import event
+from models.conta import Conta
+
+# Mesmo tokenizador usado historicamente pela calculadora:
+# números inteiros são IDs de conta, números com ponto são constantes
+_PADRAO_TOKENS = re.compile(r'\d+\.?\d*|\+|\-|\*|\/|\(|\)')
+
+_OPERACOES = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+}
+
+
+# Fórmulas especiais que não são expressões: dependências no mesmo mês
+DEPENDENCIAS_ESPECIAIS = {
+    'ACUMULADO': frozenset({27}),        # ID 28 = 28 (mês anterior) + 27
+    'ACUMULADO_ANUAL': frozenset({1}),   # ID 101 = soma do ID 1 de Jan até o mês
+}
+
+ContaCalculada = namedtuple('ContaCalculada', ['id', 'nome', 'formula'])
+
+
+class FormulaInvalida(ValueError):
+    """Fórmula que não pode ser interpretada (equivalente ao antigo SyntaxError do eval)"""
+
+
+class DependenciaCircular(ValueError):
+    """Contas calculadas que dependem umas das outras em ciclo"""
+
+
+class FormulaCompilada:
+    """Fórmula já interpretada: árvore, dependências e avaliador pronto para uso"""
+
+    def __init__(self, texto, arvore):
+        self.texto = texto
+        self.arvore = arvore
+        self.dependencias = frozenset(_coletar_contas(arvore))
+        self._avaliador = _gerar_avaliador(arvore)
+
+    def avaliar(self, valores):
+        """
+        Avalia a fórmula usando um dicionário {conta_id: valor}
+
+        Contas ausentes valem 0.0. Divisão por zero propaga ZeroDivisionError
+        para que o chamador decida o tratamento (a calculadora retorna 0.0).
+        """
+        resultado = self._avaliador(valores)
+        return float(resultado) if resultado else 0.0
+
+    def avaliar_com_rastro(self, valores):
+        """
+        Avalia registrando as contas lidas e o valor de cada operação intermediária
+        (mais lento que avaliar; usado só no modo explain)
+        """
+        entradas = {}
+        intermediarios = []
+
+        def visitar(no):
+            tipo = no[0]
+            if tipo == 'num':
+                return no[1]
+            if tipo == 'conta':
+                valor = valores.get(no[1], 0.0)
+                entradas[no[1]] = valor
+                return valor
+            if tipo == 'neg':
+                return -visitar(no[1])
+            valor = _OPERACOES[no[1]](visitar(no[2]), visitar(no[3]))
+            intermediarios.append({'expressao': texto_arvore(no), 'valor': valor})
+            return valor
+
+        erro = None
+        try:
+            resultado = visitar(self.arvore)
+            resultado = float(resultado) if resultado else 0.0
+        except ZeroDivisionError:
+            resultado = 0.0
+            erro = 'Divisão por zero'
+
+        return {'resultado': resultado, 'entradas': entradas, 'intermediarios': intermediarios, 'erro': erro}
+
+    def __repr__(self):
+        return f'<FormulaCompilada {self.texto!r}>'
+
+
+class GrafoDependencias:
+    """
+    Grafo das contas calculadas (entrada_manual = False)
+
+    Guarda, para cada conta, as contas calculadas que ela lê no mesmo mês e
+    a ordem topológica de avaliação. Contas de entrada manual são folhas e
+    não aparecem como nós.
+    """
+
+    def __init__(self, contas):
+        self.contas = {c.id: c for c in contas}
+        self.dependencias = {}
+        self.leitores = {}
+        self.erros = {}
+
+        for conta in contas:
+            try:
+                deps = dependencias_da_formula(conta.formula)
+            except FormulaInvalida as e:
+                # Fórmula inválida continua sendo avaliada (e vira 0.0), mas sem arestas
+                self.erros[conta.id] = str(e)
+                deps = frozenset()
+            self.dependencias[conta.id] = frozenset(d for d in deps if d in self.contas)
+
+            # Grafo reverso inclui as contas de entrada manual (origem das alterações)
+            for dep in deps:
+                self.leitores.setdefault(dep, set()).add(conta.id)
+
+        self.ordem = self._ordenar()
+        self._posicao = {c.id: i for i, c in enumerate(self.ordem)}
+
+    def afetadas(self, contas_alteradas):
+        """
+        Contas calculadas que precisam ser recalculadas quando as contas
+        informadas mudam, já na ordem de avaliação
+        """
+        visitadas = set()
+        pilha = list(contas_alteradas)
+        while pilha:
+            conta_id = pilha.pop()
+            if conta_id in self.contas and conta_id not in visitadas:
+                # Uma conta calculada alterada diretamente também é recalculada
+                visitadas.add(conta_id)
+            for leitor in self.leitores.get(conta_id, ()):
+                if leitor not in visitadas:
+                    visitadas.add(leitor)
+                    pilha.append(leitor)
+        return sorted((self.contas[cid] for cid in visitadas), key=lambda c: self._posicao[c.id])
+
+    def _ordenar(self):
+        """Ordenação topológica (Kahn); empates resolvidos pelo menor ID"""
+        pendentes = {cid: len(deps) for cid, deps in self.dependencias.items()}
+        leitores = {cid: [] for cid in self.dependencias}
+        for cid, deps in self.dependencias.items():
+            for dep in deps:
+                leitores[dep].append(cid)
+
+        prontas = [cid for cid, qtd in pendentes.items() if qtd == 0]
+        heapq.heapify(prontas)
+        ordem = []
+        while prontas:
+            cid = heapq.heappop(prontas)
+            ordem.append(self.contas[cid])
+            for leitor in leitores[cid]:
+                pendentes[leitor] -= 1
+                if pendentes[leitor] == 0:
+                    heapq.heappush(prontas, leitor)
+
+        if len(ordem) != len(self.contas):
+            em_ciclo = sorted(cid for cid, qtd in pendentes.items() if qtd > 0)
+            raise DependenciaCircular(f"Dependência circular entre as contas {em_ciclo}")
+        return ordem
+
+
+def dependencias_da_formula(formula):
+    """Retorna os IDs de conta lidos por uma fórmula no mesmo mês"""
+    if not formula:
+        return frozenset()
+    if formula in DEPENDENCIAS_ESPECIAIS:
+        return DEPENDENCIAS_ESPECIAIS[formula]
+    return compilar_formula(formula).dependencias
+
+
+# Cache global: texto da fórmula -> FormulaCompilada
+_cache_compiladas = {}
+
+# Cache global do grafo das contas calculadas
+_grafo = None
+
+
+def compilar_formula(texto):
+    """Retorna a fórmula compilada, interpretando o texto apenas na primeira vez"""
+    compilada = _cache_compiladas.get(texto)
+    if compilada is None:
+        compilada = FormulaCompilada(texto, _interpretar(texto))
+        _cache_compiladas[texto] = compilada
+    return compilada
+
+
+def obter_grafo():
+    """Retorna o grafo de dependências, montando-o a partir da tabela contas se preciso"""
+    global _grafo
+    if _grafo is None:
+        contas = Conta.query.filter_by(entrada_manual=False).order_by(Conta.id).all()
+        _grafo = GrafoDependencias([ContaCalculada(c.id, c.nome, c.formula) for c in contas])
+    return _grafo
+
+
+def invalidar_cache():
+    """Descarta fórmulas compiladas e o grafo (chamado quando a tabela contas muda)"""
+    global _grafo
+    _cache_compiladas.clear()
+    _grafo = None
+
+
+def _ao_alterar_conta(mapper, connection, target):
+    invalidar_cache()
+
+
+for _evento in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Conta, _evento, _ao_alterar_conta)
+
+
+# ============================================
+# INTERPRETADOR (descida recursiva)
+# ============================================
+
+def _interpretar(texto):
+    """Converte o texto da fórmula em uma árvore de tuplas"""
+    tokens = _PADRAO_TOKENS.findall(str(texto))
+    if not tokens:
+        raise FormulaInvalida(f"Fórmula vazia: {texto!r}")
+
+    posicao, arvore = _expressao(tokens, 0)
+    if posicao != len(tokens):
+        raise FormulaInvalida(f"Token inesperado '{tokens[posicao]}' em {texto!r}")
+    return arvore
+
+
+def _expressao(tokens, pos):
+    pos, esquerda = _termo(tokens, pos)
+    while pos < len(tokens) and tokens[pos] in ('+', '-'):
+        op = tokens[pos]
+        pos, direita = _termo(tokens, pos + 1)
+        esquerda = ('bin', op, esquerda, direita)
+    return pos, esquerda
+
+
+def _termo(tokens, pos):
+    pos, esquerda = _fator(tokens, pos)
+    while pos < len(tokens) and tokens[pos] in ('*', '/'):
+        op = tokens[pos]
+        pos, direita = _fator(tokens, pos + 1)
+        esquerda = ('bin', op, esquerda, direita)
+    return pos, esquerda
+
+
+def _fator(tokens, pos):
+    if pos >= len(tokens):
+        raise FormulaInvalida("Fim inesperado da fórmula")
+
+    token = tokens[pos]
+    if token == '-':
+        pos, operando = _fator(tokens, pos + 1)
+        return pos, ('neg', operando)
+    if token == '+':
+        return _fator(tokens, pos + 1)
+    if token == '(':
+        pos, interno = _expressao(tokens, pos + 1)
+        if pos >= len(tokens) or tokens[pos] != ')':
+            raise FormulaInvalida("Parêntese não fechado")
+        return pos + 1, interno
+    if token.isdigit():
+        return pos + 1, ('conta', int(token))
+    if token[0].isdigit():
+        return pos + 1, ('num', float(token))
+
+    raise FormulaInvalida(f"Token inesperado '{token}'")
+
+
+def _coletar_contas(no):
+    tipo = no[0]
+    if tipo == 'conta':
+        yield no[1]
+    elif tipo == 'neg':
+        yield from _coletar_contas(no[1])
+    elif tipo == 'bin':
+        yield from _coletar_contas(no[2])
+        yield from _coletar_contas(no[3])
+
+
+def texto_arvore(no):
+    """Representação textual de um nó (para o rastro do explain)"""
+    tipo = no[0]
+    if tipo == 'num':
+        return repr(no[1])
+    if tipo == 'conta':
+        return str(no[1])
+    if tipo == 'neg':
+        return f"-{texto_arvore(no[1])}"
+    return f"({texto_arvore(no[2])} {no[1]} {texto_arvore(no[3])})"
+
+
+def _gerar_avaliador(no):
+    """Transforma a árvore em closures aninhadas (sem montagem de string nem eval)"""
+    tipo = no[0]
+
+    if tipo == 'num':
+        constante = no[1]
+        return lambda valores: constante
+
+    if tipo == 'conta':
+        conta_id = no[1]
+        return lambda valores: valores.get(conta_id, 0.0)
+
+    if tipo == 'neg':
+        operando = _gerar_avaliador(no[1])
+        return lambda valores: -operando(valores)
+
+    funcao = _OPERACOES[no[1]]
+    esquerda = _gerar_avaliador(no[2])
+    direita = _gerar_avaliador(no[3])
+    return lambda valores: funcao(esquerda(valores), direita(valores))
@@ -1,8 +1,8 @@
 import pandas as pd
 from models import db
 from models.conta import Conta
-from models.valor_mensal import ValorMensal
-from datetime import datetime
+from services.meses_sujos import marcar_mes_sujo
+from services.persistencia import gravar_valores
 import re
 
 class ImportadorExcel:
@@ -12,6 +12,8 @@ class ImportadorExcel:
         self.caminho = caminho_arquivo
         self.erros = []
         self.sucessos = 0
+        self.alteracoes = {}  # {(mes, ano): {conta_id, ...}}
+        self.valores = {}  # {(conta_id, mes, ano): valor}, gravados em lote no final
         
     def importar(self):
         """Importa todos os dados do Excel"""
@@ -30,6 +32,13 @@ class ImportadorExcel:
                 elif aba.upper() in ['DRE', 'DEMONSTRACAO']:
                     self._processar_aba(excel_file, aba, 'DRE')
             
+            # Gravar todos os valores em um único upsert
+            gravar_valores(self.valores, commit=False)
+            
+            # Marcar os meses importados para recálculo (feito na próxima leitura)
+            for (mes, ano), contas in self.alteracoes.items():
+                marcar_mes_sujo(mes, ano, contas)
+            
             # Salvar no banco
             db.session.commit()
             
@@ -200,25 +209,9 @@ class ImportadorExcel:
         return None, None
     
     def _salvar_valor(self, conta_id, mes, ano, valor):
-        """Salva ou atualiza um valor no banco"""
-        # Verificar se já existe
-        valor_existente = ValorMensal.query.filter_by(
-            conta_id=conta_id,
-            mes=mes,
-            ano=ano
-        ).first()
-        
-        if valor_existente:
-            valor_existente.valor = valor
-            valor_existente.data_atualizacao = datetime.utcnow()
-        else:
-            novo_valor = ValorMensal(
-                conta_id=conta_id,
-                mes=mes,
-                ano=ano,
-                valor=valor
-            )
-            db.session.add(novo_valor)
+        """Guarda o valor para a gravação em lote (upsert) no fim da importação"""
+        self.alteracoes.setdefault((mes, ano), set()).add(conta_id)
+        self.valores[(conta_id, mes, ano)] = valor
 
 
 def importar_excel(caminho_arquivo):
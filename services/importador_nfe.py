@@ -2,7 +2,8 @@ import pandas as pd
 from datetime import datetime
 from models import db
 from models.nota_fiscal import NotaFiscal
-from models.valor_mensal import ValorMensal
+from services.meses_sujos import marcar_mes_sujo
+from services.persistencia import gravar_valores
 
 def importar_nfe(caminho_arquivo):
     """
@@ -250,6 +251,7 @@ def _atualizar_compras():
         NotaFiscal.ano
     ).filter_by(tipo_nfe='Entrada').distinct().all()
     
+    totais = {}
     for mes, ano in meses_anos:
         # Somar valores do mês
         total = db.session.query(
@@ -260,25 +262,11 @@ def _atualizar_compras():
             ano=ano
         ).scalar() or 0.0
         
-        # Atualizar ou criar valor mensal
-        valor_existente = ValorMensal.query.filter_by(
-            conta_id=95,
-            mes=mes,
-            ano=ano
-        ).first()
-        
-        if valor_existente:
-            valor_existente.valor = total
-        else:
-            novo_valor = ValorMensal(
-                conta_id=95,
-                mes=mes,
-                ano=ano,
-                valor=total
-            )
-            db.session.add(novo_valor)
-        
-        db.session.commit()
+        totais[(95, mes, ano)] = total
+        marcar_mes_sujo(mes, ano, {95})
         print(f"✅ {mes}/{ano}: R$ {total:,.2f}")
     
+    # Atualizar ou criar os valores mensais em um único upsert
+    gravar_valores(totais, commit=False)
+    db.session.commit()
     print("✅ Conta Compras atualizada!")
\ No newline at end of file
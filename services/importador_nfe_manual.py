@@ -5,9 +5,7 @@ from sqlalchemy.exc import IntegrityError
 class ImportadorNfeManual:
     def processar_arquivo(self, file_storage):
         # Importações tardias para evitar erro circular
-        from app import db
-        from models.nota_fiscal import NotaFiscal
-        from models.valor_mensal import ValorMensal
+        from services.persistencia import gravar_notas
 
         try:
             # Ler o arquivo Excel
@@ -16,7 +14,7 @@ class ImportadorNfeManual:
             # Limpar nomes das colunas (remover espaços extras)
             df.columns = df.columns.str.strip()
             
-            notas_processadas = 0
+            notas = []
             meses_para_recalcular = set()
 
             for index, row in df.iterrows():
@@ -40,47 +38,35 @@ class ImportadorNfeManual:
                     # Ex: MANUAL_12345_FORNECEDORX
                     chave_unica = f"MANUAL_{numero}_{fornecedor.replace(' ', '').upper()}"
 
-                    # Verificar se já existe
-                    existe = NotaFiscal.query.filter_by(chave_externa=chave_unica).first()
-
                     mes = data_emissao.month
                     ano = data_emissao.year
                     meses_para_recalcular.add((mes, ano))
 
-                    if existe:
-                        # Atualiza dados existentes
-                        existe.valor = valor
-                        existe.data_emissao = data_emissao
-                    else:
-                        # Cria nova nota
-                        nova_nota = NotaFiscal(
-                            chave_externa=chave_unica,
-                            numero=numero,
-                            descricao=descricao,
-                            fornecedor=fornecedor,
-                            valor=valor,
-                            data_emissao=data_emissao,
-                            mes=mes,
-                            ano=ano,
-                            conta_id=95, # ID 95 = Compras
-                            categoria="Importação Manual",
-                            empresa=empresa
-                        )
-                        db.session.add(nova_nota)
-                    
-                    notas_processadas += 1
+                    notas.append({
+                        'chave_externa': chave_unica,
+                        'numero': numero,
+                        'descricao': descricao,
+                        'fornecedor': fornecedor,
+                        'valor': valor,
+                        'data_emissao': data_emissao,
+                        'mes': mes,
+                        'ano': ano,
+                        'conta_id': 95, # ID 95 = Compras
+                        'categoria': "Importação Manual",
+                        'empresa': empresa
+                    })
 
                 except Exception as e:
                     print(f"⚠️ Erro na linha {index + 2}: {e}")
                     continue # Pula para a próxima linha se der erro nessa
 
-            # Salva as notas
-            db.session.commit()
+            # Salva as notas em um único upsert (nota já existente: atualiza valor e data)
+            gravar_notas(notas, atualizar=('valor', 'data_emissao'))
 
             # Recalcula os totais da conta 95
             self._recalcular_conta_95(meses_para_recalcular)
 
-            return {"sucesso": True, "qtd": notas_processadas}
+            return {"sucesso": True, "qtd": len(notas)}
 
         except Exception as e:
             return {"sucesso": False, "erro": str(e)}
@@ -88,21 +74,22 @@ class ImportadorNfeManual:
     def _recalcular_conta_95(self, meses_set):
         from app import db
         from models.nota_fiscal import NotaFiscal
-        from models.valor_mensal import ValorMensal
+        from services.meses_sujos import marcar_mes_sujo
+        from services.persistencia import gravar_valores
 
         print("🧮 Recalculando totais da Conta 95 (Importação Manual)...")
         
+        totais = {}
         for mes, ano in meses_set:
             total = db.session.query(db.func.sum(NotaFiscal.valor))\
-                .filter(NotaFiscal.conta_id == 95, NotaFiscal.mes == mes, NotaFiscal.ano == ano)\
+                .filter(NotaFiscal.conta_id == 95, NotaFiscal.periodo == ano * 12 + mes - 1)\
                 .scalar() or 0.0
             
-            registro = ValorMensal.query.filter_by(conta_id=95, mes=mes, ano=ano).first()
+            totais[(95, mes, ano)] = total
             
-            if registro:
-                registro.valor = total
-            else:
-                novo = ValorMensal(conta_id=95, mes=mes, ano=ano, valor=total)
-                db.session.add(novo)
+            # Contas que dependem de Compras ficam pendentes de recálculo
+            marcar_mes_sujo(mes, ano, {95})
         
+        # Atualizar ou criar os totais em um único upsert
+        gravar_valores(totais, commit=False)
         db.session.commit()
\ No newline at end of file
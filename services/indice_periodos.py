@@ -0,0 +1,87 @@
+import threading
+from datetime import datetime
+import numpy as np
+from models.conta import Conta
+from services.meses_sujos import listar_meses_sujos
+from services.snapshot_valores import obter_snapshot
+from services.versao_dados import versao_dados
+
+_trava = threading.Lock()
+_indice = None
+
+
+class IndicePeriodos:
+    """
+    Meses (mes, ano) com dados e a situação de cada um:
+
+    - fechado: o mês já terminou (anterior ao mês atual)
+    - calculado: já tem valores de contas calculadas (com fórmula)
+    - sujo: entradas alteradas desde o último cálculo (meses_sujos)
+    """
+
+    def __init__(self, linhas, calculados, sujos, versao=0):
+        self.linhas = linhas          # {(mes, ano): quantidade de valores}
+        self.calculados = calculados  # {(mes, ano)}
+        self.sujos = sujos            # {(mes, ano)}, inclusive meses ainda sem valores
+        self.versao = versao
+        # Do mais recente para o mais antigo
+        self.periodos = sorted(linhas, key=lambda p: (p[1], p[0]), reverse=True)
+
+    @classmethod
+    def montar(cls, versao=0):
+        """Monta o índice a partir do snapshot de valores e da tabela de meses sujos"""
+        snapshot = obter_snapshot()
+        unicos, quantidades = np.unique(snapshot.periodo, return_counts=True)
+        linhas = {
+            (int(p % 12) + 1, int(p // 12)): int(q) for p, q in zip(unicos, quantidades)
+        }
+
+        contas_calculadas = [c.id for c in Conta.query.filter_by(entrada_manual=False).all()]
+        com_calculo = np.unique(snapshot.periodo[np.isin(snapshot.conta_id, contas_calculadas)])
+        calculados = {(int(p % 12) + 1, int(p // 12)) for p in com_calculo}
+
+        sujos = {(m.mes, m.ano) for m in listar_meses_sujos()}
+        return cls(linhas, calculados, sujos, versao)
+
+    def anos(self):
+        """Anos com dados, em ordem crescente"""
+        return sorted({ano for _, ano in self.linhas})
+
+    def ultimos(self, limite=12):
+        """Últimos (mes, ano) com dados, do mais recente para o mais antigo"""
+        return self.periodos[:limite]
+
+    def situacao(self, mes, ano, hoje=None):
+        hoje = hoje or datetime.now()
+        return {
+            'mes': mes,
+            'ano': ano,
+            'linhas': self.linhas.get((mes, ano), 0),
+            'fechado': (ano, mes) < (hoje.year, hoje.month),
+            'calculado': (mes, ano) in self.calculados,
+            'sujo': (mes, ano) in self.sujos
+        }
+
+    def listar(self):
+        """Situação de todos os meses com dados ou sujos (mais recente primeiro)"""
+        hoje = datetime.now()
+        periodos = sorted(set(self.linhas) | self.sujos, key=lambda p: (p[1], p[0]), reverse=True)
+        return [self.situacao(mes, ano, hoje) for mes, ano in periodos]
+
+
+def obter_indice_periodos():
+    """
+    Índice de períodos atual (remontado quando a versão dos dados muda:
+    valores inseridos/removidos ou meses marcados/limpos como sujos)
+    """
+    global _indice
+    versao = versao_dados()
+    indice = _indice
+    if indice is not None and indice.versao == versao:
+        return indice
+
+    with _trava:
+        if _indice is None or _indice.versao != versao:
+            _indice = IndicePeriodos.montar(versao)
+        return _indice
+
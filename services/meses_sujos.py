@@ -0,0 +1,115 @@
+from datetime import datetime
+from models import db
+from models.mes_sujo import MesSujo
+from services.periodos import indice_periodo
+from services.versao_dados import marcar_periodos_alterados
+
+# Recálculos seguidos do mesmo mês quando ele é marcado de novo durante o cálculo
+TENTATIVAS_RECALCULO = 3
+
+
+def marcar_mes_sujo(mes, ano, contas_alteradas=None):
+    """
+    Marca um mês como desatualizado (sem commit: vai junto com a escrita do chamador)
+
+    As contas alteradas se acumulam até o próximo recálculo;
+    None significa recálculo completo do mês. data_marcacao muda a cada
+    marcação: é a versão que recalcular_se_sujo confere antes de limpar.
+    """
+    if contas_alteradas is not None and not contas_alteradas:
+        return
+
+    registro = db.session.get(MesSujo, (mes, ano))
+    if registro is None:
+        db.session.add(MesSujo(mes=mes, ano=ano, contas_alteradas=_serializar(contas_alteradas),
+                               data_marcacao=datetime.utcnow()))
+        db.session.flush()
+        return
+
+    registro.data_marcacao = datetime.utcnow()
+    atuais = registro.obter_contas()
+    if atuais is None or contas_alteradas is None:
+        registro.contas_alteradas = None
+    else:
+        registro.contas_alteradas = _serializar(atuais | set(contas_alteradas))
+
+
+def marcar_meses_sujos(periodos, contas_alteradas=None):
+    """Marca vários meses ((mes, ano)) de uma vez"""
+    for mes, ano in periodos:
+        marcar_mes_sujo(mes, ano, contas_alteradas)
+
+
+def recalcular_se_sujo(mes, ano):
+    """
+    Recalcula o mês se ele estiver marcado como sujo e limpa a marca
+
+    A marca só é removida se continuar como foi lida (mesmas contas e
+    data_marcacao): se outra escrita marcou o mês durante o cálculo, o
+    resultado é gravado, a marca fica e o mês é recalculado de novo.
+
+    Returns:
+        int: contas calculadas (0 se o mês já estava em dia)
+    """
+    from services.calculadora import Calculadora
+
+    total = 0
+    for _ in range(TENTATIVAS_RECALCULO):
+        registro = db.session.get(MesSujo, (mes, ano))
+        if registro is None:
+            break
+        lida = (registro.contas_alteradas, registro.data_marcacao)
+
+        try:
+            total += Calculadora(mes, ano).calcular_todas_contas(registro.obter_contas(), commit=False)
+            # Remoção condicional, no mesmo commit do cálculo
+            limpos = MesSujo.query.filter_by(
+                mes=mes, ano=ano, contas_alteradas=lida[0], data_marcacao=lida[1]
+            ).delete(synchronize_session=False)
+            if limpos:
+                marcar_periodos_alterados(db.session, {(mes, ano)})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if limpos:
+            break
+        # A marca mudou durante o cálculo: relê e recalcula
+        db.session.expire_all()
+    return total
+
+
+def recalcular_meses_sujos(inicio=None, fim=None):
+    """
+    Recalcula os meses sujos entre inicio e fim ((mes, ano); None = sem limite),
+    do mais antigo para o mais recente
+
+    Chamado pelas leituras do snapshot antes de ler: assim nenhum total
+    calculado (margem, EBITDA...) fica atrás das entradas já gravadas.
+
+    Returns:
+        int: contas calculadas
+    """
+    # Import local: o índice de períodos importa este módulo
+    from services.indice_periodos import obter_indice_periodos
+
+    de = indice_periodo(*inicio) if inicio else None
+    ate = indice_periodo(*fim) if fim else None
+    total = 0
+    for mes, ano in sorted(obter_indice_periodos().sujos, key=lambda p: (p[1], p[0])):
+        indice = indice_periodo(mes, ano)
+        if (de is None or indice >= de) and (ate is None or indice <= ate):
+            total += recalcular_se_sujo(mes, ano)
+    return total
+
+
+def listar_meses_sujos():
+    """Lista os meses pendentes de recálculo"""
+    return MesSujo.query.order_by(MesSujo.ano, MesSujo.mes).all()
+
+
+def _serializar(contas):
+    if contas is None:
+        return None
+    return ','.join(str(c) for c in sorted(contas))
@@ -0,0 +1,304 @@
+import time
+import numpy as np
+from models import db
+from models.valor_mensal import ValorMensal
+from services.calculadora import VALORES_FIXOS, ANO_MINIMO_CALCULO
+from services.formulas import (
+    compilar_formula, obter_grafo, dependencias_da_formula, texto_arvore, FormulaInvalida
+)
+from services.persistencia import gravar_valores
+from services.acumulados import (
+    soma_com_reinicio, soma_anual,
+    CONTA_ACUMULADO, CONTA_ACUMULADO_ANUAL, CONTA_FLUXO_CAIXA, CONTA_RECEITA
+)
+from services.periodos import indice_periodo, periodo_do_indice
+
+
+class MotorVetorial:
+    """
+    Calcula várias competências de uma vez sobre uma matriz contas x meses
+
+    Cada fórmula compilada é avaliada como operação NumPy sobre a linha
+    inteira (todos os meses de uma vez). Meses anteriores ao início entram
+    como contexto (acumulados), mas não são recalculados nem gravados.
+    Anos anteriores a ano_minimo (histórico fixo) também ficam de fora.
+    """
+
+    def __init__(self, inicio, fim, rastrear=False, ano_minimo=ANO_MINIMO_CALCULO):
+        # inicio e fim no formato (mes, ano)
+        self.inicio = indice_periodo(*inicio)
+        self.fim = indice_periodo(*fim)
+        if self.fim < self.inicio:
+            raise ValueError("Período final anterior ao inicial")
+
+        # Contexto: desde janeiro do ano inicial (acumulado anual) e pelo
+        # menos um mês antes do início (acumulado do mês anterior)
+        _, ano_inicio = periodo_do_indice(self.inicio)
+        self.primeiro = min(indice_periodo(1, ano_inicio), self.inicio - 1)
+        self.periodos = [periodo_do_indice(i) for i in range(self.primeiro, self.fim + 1)]
+
+        self.ano_minimo = ano_minimo
+        self.linhas = {}
+        self.matriz = None
+        self.colunas_calculo = None
+        self.tempos = {}
+        # Modo explain: {conta_id: tempo, intermediários e máscara de divisão por zero}
+        self.rastro = {} if rastrear else None
+        self._intermediarios = None
+        self._divisao_zero = None
+
+    # ----------------------------------------
+    # Carga
+    # ----------------------------------------
+
+    def carregar(self):
+        """Lê todos os valores do intervalo em uma única consulta"""
+        inicio = time.perf_counter()
+
+        registros = db.session.query(
+            ValorMensal.conta_id, ValorMensal.periodo, ValorMensal.valor
+        ).filter(ValorMensal.periodo.between(self.primeiro, self.fim)).all()
+
+        grafo = obter_grafo()
+        contas = set(grafo.contas) | set(grafo.leitores)
+        contas.update(r[0] for r in registros)
+        self.linhas = {conta_id: i for i, conta_id in enumerate(sorted(contas))}
+        self.matriz = np.zeros((len(self.linhas), len(self.periodos)))
+
+        meses_com_dados = set()
+        if registros:
+            dados = np.array(
+                [(self.linhas[c], p - self.primeiro, v or 0.0) for c, p, v in registros]
+            )
+            colunas = dados[:, 1].astype(int)
+            self.matriz[dados[:, 0].astype(int), colunas] = dados[:, 2]
+            meses_com_dados = set(colunas.tolist())
+
+        # Só calcula meses do intervalo pedido, com dados e fora da trava histórica
+        self.colunas_calculo = np.array([
+            j for j, (mes, ano) in enumerate(self.periodos)
+            if self.primeiro + j >= self.inicio and j in meses_com_dados and ano >= self.ano_minimo
+        ], dtype=int)
+
+        self.tempos['carga'] = time.perf_counter() - inicio
+        return len(registros)
+
+    # ----------------------------------------
+    # Cálculo
+    # ----------------------------------------
+
+    def calcular(self):
+        """Avalia todas as contas calculadas em ordem topológica"""
+        if self.matriz is None:
+            self.carregar()
+
+        inicio = time.perf_counter()
+        colunas = self.colunas_calculo
+        if len(colunas):
+            for conta in obter_grafo().ordem:
+                inicio_conta = time.perf_counter()
+                if self.rastro is not None:
+                    self._intermediarios = []
+                    self._divisao_zero = None
+
+                if conta.formula == "ACUMULADO":
+                    resultado = self._acumulado(conta.id)
+                elif conta.formula == "ACUMULADO_ANUAL":
+                    resultado = self._acumulado_anual(conta.id)
+                else:
+                    resultado = self._formula(conta.formula)
+
+                self.matriz[self.linhas[conta.id], colunas] = resultado[colunas]
+                self._aplicar_fixos(conta.id)
+
+                if self.rastro is not None:
+                    self.rastro[conta.id] = {
+                        'segundos': time.perf_counter() - inicio_conta,
+                        'intermediarios': self._intermediarios,
+                        'divisao_zero': self._divisao_zero
+                    }
+
+        self.tempos['calculo'] = time.perf_counter() - inicio
+
+    def _linha(self, conta_id):
+        indice = self.linhas.get(conta_id)
+        if indice is None:
+            return np.zeros(len(self.periodos))
+        return self.matriz[indice]
+
+    def _formula(self, formula):
+        zeros = np.zeros(len(self.periodos))
+        if not formula:
+            return zeros
+        try:
+            arvore = compilar_formula(formula).arvore
+        except FormulaInvalida as e:
+            print(f"⚠️ Erro de sintaxe na fórmula '{formula}': {e}")
+            return zeros
+
+        # Colunas com divisão por zero valem 0.0 (mesmo tratamento do ZeroDivisionError)
+        divisao_zero = np.zeros(len(self.periodos), dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            resultado = self._avaliar(arvore, divisao_zero)
+        resultado = np.broadcast_to(resultado, zeros.shape).astype(float)
+        resultado[divisao_zero] = 0.0
+        if self.rastro is not None:
+            self._divisao_zero = divisao_zero
+        return resultado
+
+    def _avaliar(self, no, divisao_zero):
+        tipo = no[0]
+        if tipo == 'num':
+            return no[1]
+        if tipo == 'conta':
+            return self._linha(no[1])
+        if tipo == 'neg':
+            return -self._avaliar(no[1], divisao_zero)
+
+        esquerda = self._avaliar(no[2], divisao_zero)
+        direita = self._avaliar(no[3], divisao_zero)
+        op = no[1]
+        if op == '+':
+            resultado = esquerda + direita
+        elif op == '-':
+            resultado = esquerda - direita
+        elif op == '*':
+            resultado = esquerda * direita
+        else:
+            zero = np.broadcast_to(direita == 0, divisao_zero.shape)
+            divisao_zero |= zero
+            resultado = esquerda / np.where(zero, 1.0, direita)
+
+        if self._intermediarios is not None:
+            # O texto do nó só é montado no explain, fora da medição
+            self._intermediarios.append((no, resultado))
+        return resultado
+
+    def _acumulado(self, conta_id):
+        """ID 28: valor do mês anterior + ID 27 do mês, como soma corrida em uma passada"""
+        resultado = self._linha(conta_id).copy()
+        if conta_id != CONTA_ACUMULADO:
+            resultado[:] = 0.0
+            return resultado
+
+        calcular = np.zeros(len(self.periodos), dtype=bool)
+        calcular[self.colunas_calculo] = True
+        base = resultado.copy()
+        tem_fixo = np.zeros(len(self.periodos), dtype=bool)
+        for j in self.colunas_calculo:
+            fixo = VALORES_FIXOS.get((conta_id,) + self.periodos[j])
+            if fixo is not None:
+                base[j] = fixo
+                tem_fixo[j] = True
+
+        # Meses fora do cálculo (contexto/sem dados) mantêm o valor gravado
+        return soma_com_reinicio(self._linha(CONTA_FLUXO_CAIXA), ~calcular | tem_fixo, base)
+
+    def _acumulado_anual(self, conta_id):
+        """ID 101: soma do ID 1 de janeiro até o mês (soma prefixada reiniciada a cada ano)"""
+        if conta_id != CONTA_ACUMULADO_ANUAL:
+            return np.zeros(len(self.periodos))
+        return soma_anual(self._linha(CONTA_RECEITA), [mes for mes, _ in self.periodos])
+
+    def _aplicar_fixos(self, conta_id):
+        linha = self.linhas[conta_id]
+        for j in self.colunas_calculo:
+            fixo = VALORES_FIXOS.get((conta_id,) + self.periodos[j])
+            if fixo is not None:
+                self.matriz[linha, j] = fixo
+
+    # ----------------------------------------
+    # Gravação
+    # ----------------------------------------
+
+    def resultados(self):
+        """Dicionário {(conta_id, mes, ano): valor} das células calculadas"""
+        valores = {}
+        for conta in obter_grafo().ordem:
+            linha = self.matriz[self.linhas[conta.id]]
+            for j in self.colunas_calculo:
+                mes, ano = self.periodos[j]
+                valores[(conta.id, mes, ano)] = float(linha[j])
+        return valores
+
+    def gravar(self, commit=True):
+        gravacao = gravar_valores(self.resultados(), commit=commit)
+        self.tempos['gravacao'] = gravacao['segundos']
+        return gravacao
+
+
+def explicar_mes(mes, ano):
+    """
+    Versão vetorial do explain: calcula o mês no motor em modo rastreado,
+    sem gravar nada (mesmo formato de services.calculadora.explicar_mes)
+
+    A carga é uma consulta única para todas as contas, então o tempo de
+    banco aparece só nas etapas e não por conta.
+    """
+    motor = MotorVetorial((mes, ano), (mes, ano), rastrear=True)
+    motor.carregar()
+    motor.calcular()
+
+    explicacao = {
+        'mes': mes,
+        'ano': ano,
+        'motor': 'vetorial',
+        'total_calculadas': 0,
+        'tempos_ms': {etapa: segundos * 1000 for etapa, segundos in motor.tempos.items()},
+        'contas': []
+    }
+    j = indice_periodo(mes, ano) - motor.primeiro
+    if j not in motor.colunas_calculo:
+        return explicacao
+
+    grafo = obter_grafo()
+    for conta in grafo.ordem:
+        rastro = motor.rastro[conta.id]
+        valor_fixo = (conta.id, mes, ano) in VALORES_FIXOS
+        divisao_zero = rastro['divisao_zero']
+        explicacao['contas'].append({
+            'conta_id': conta.id,
+            'nome': conta.nome,
+            'formula': conta.formula,
+            'resultado': float(motor.matriz[motor.linhas[conta.id], j]),
+            'entradas': {} if valor_fixo else {
+                c: float(motor._linha(c)[j]) for c in sorted(dependencias_da_formula(conta.formula))
+            },
+            'intermediarios': [] if valor_fixo else [
+                {'expressao': texto_arvore(no), 'valor': float(np.broadcast_to(valor, (len(motor.periodos),))[j])}
+                for no, valor in rastro['intermediarios']
+            ],
+            'erro': 'Divisão por zero' if divisao_zero is not None and divisao_zero[j] and not valor_fixo else None,
+            'valor_fixo': valor_fixo,
+            'tempo_calculo_ms': rastro['segundos'] * 1000,
+            'tempo_banco_ms': 0.0,
+            'custo_ms': rastro['segundos'] * 1000
+        })
+
+    explicacao['total_calculadas'] = len(explicacao['contas'])
+    explicacao['contas'].sort(key=lambda item: item['custo_ms'], reverse=True)
+    return explicacao
+
+
+def calcular_periodo(inicio, fim, commit=True, ano_minimo=ANO_MINIMO_CALCULO):
+    """
+    Recalcula todas as contas calculadas entre inicio e fim ((mes, ano))
+
+    Returns:
+        dict: meses calculados, linhas gravadas e tempos de cada etapa
+    """
+    motor = MotorVetorial(inicio, fim, ano_minimo=ano_minimo)
+    motor.carregar()
+    motor.calcular()
+    gravacao = motor.gravar(commit=commit)
+
+    print(f"🧮 {len(motor.colunas_calculo)} meses x {len(obter_grafo().ordem)} contas | "
+          f"carga {motor.tempos['carga'] * 1000:.1f} ms | "
+          f"cálculo {motor.tempos['calculo'] * 1000:.1f} ms | "
+          f"gravação {motor.tempos['gravacao'] * 1000:.1f} ms")
+
+    return {
+        'meses': [motor.periodos[j] for j in motor.colunas_calculo],
+        'linhas': gravacao['linhas'],
+        'tempos': motor.tempos
+    }
@@ -1,7 +1,10 @@
 import requests
 import json
 from datetime import datetime
-from sqlalchemy.exc import IntegrityError
+
+# Notas por transação na gravação: um erro só desfaz o lote dele,
+# que então é regravado nota a nota para isolar as que falharam
+LOTE_NOTAS = 500
 
 class OmieService:
     def __init__(self):
@@ -26,6 +29,7 @@ class OmieService:
 
         total_notas_processadas = 0
         meses_para_recalcular = set()
+        notas_sincronizadas = []
 
         print(f"\n🔄 --- INICIANDO SINCRONIZAÇÃO ({dt_ini_omie} a {dt_fim_omie}) ---")
 
@@ -112,7 +116,7 @@ class OmieService:
                             ano_ref = data_emissao.year
                             meses_para_recalcular.add((mes_ref, ano_ref))
 
-                            self._salvar_nota(
+                            notas_sincronizadas.append(self._montar_nota(
                                 chave_unica=chave_unica,
                                 numero=numero_nf,
                                 fornecedor=fornecedor,
@@ -122,7 +126,7 @@ class OmieService:
                                 mes=mes_ref,
                                 ano=ano_ref,
                                 descricao=descricao_final
-                            )
+                            ))
                             total_notas_processadas += 1
 
                         except Exception as e_item:
@@ -138,61 +142,91 @@ class OmieService:
                     print(f"❌ Erro de conexão na {empresa['nome']}: {str(e)}")
                     continuar_buscando = False
 
+        notas_com_erro = []
         if total_notas_processadas > 0:
+            total_notas_processadas, notas_com_erro = self._gravar_notas(notas_sincronizadas)
             self._recalcular_conta_95(meses_para_recalcular)
         
-        return {"status": "sucesso", "notas_processadas": total_notas_processadas}
+        return {
+            "status": "sucesso",
+            "notas_processadas": total_notas_processadas,
+            "notas_com_erro": notas_com_erro,
+            "meses": sorted(meses_para_recalcular, key=lambda m: (m[1], m[0]))
+        }
+
+    def _gravar_notas(self, notas):
+        """
+        Grava as notas em upserts de LOTE_NOTAS (nota já existente: atualiza
+        valor, fornecedor, data e descrição), um commit por lote
+
+        Um lote com erro é desfeito e regravado nota a nota: as demais notas
+        entram e as que falharam são puladas e listadas.
 
-    def _salvar_nota(self, chave_unica, numero, fornecedor, valor, data_emissao, empresa, mes, ano, descricao):
+        Returns:
+            tuple: (notas gravadas, lista de {'chave', 'numero', 'erro'} das que falharam)
+        """
         from app import db
-        from models.nota_fiscal import NotaFiscal
-        
-        existe = NotaFiscal.query.filter_by(chave_externa=chave_unica).first()
-        
-        if existe:
-            existe.valor = valor
-            existe.fornecedor = fornecedor
-            existe.data_emissao = data_emissao.date()
-            existe.descricao = descricao
-        else:
-            nova_nota = NotaFiscal(
-                chave_externa=chave_unica,
-                numero=str(numero),
-                descricao=descricao,
-                fornecedor=fornecedor,
-                valor=valor,
-                data_emissao=data_emissao.date(),
-                mes=mes,
-                ano=ano,
-                conta_id=95,
-                categoria="Entrada NFe (Omie)",
-                empresa=empresa
-            )
-            db.session.add(nova_nota)
-        
-        try:
-            db.session.commit()
-        except IntegrityError:
-            db.session.rollback()
+        from services.persistencia import gravar_notas
+
+        atualizar = ('valor', 'fornecedor', 'data_emissao', 'descricao')
+        gravadas = 0
+        falhas = []
+        for inicio in range(0, len(notas), LOTE_NOTAS):
+            lote = notas[inicio:inicio + LOTE_NOTAS]
+            try:
+                gravadas += gravar_notas(lote, atualizar=atualizar)['linhas']
+                continue
+            except Exception:
+                db.session.rollback()
+
+            for nota in lote:
+                try:
+                    gravadas += gravar_notas([nota], atualizar=atualizar)['linhas']
+                except Exception as e:
+                    db.session.rollback()
+                    # Mensagem do banco, sem o SQL que o SQLAlchemy anexa
+                    erro = str(getattr(e, 'orig', None) or e).strip()[:200]
+                    print(f"      ❌ NF {nota['numero']} (recebimento {nota['chave_externa']}) não gravada: {erro}")
+                    falhas.append({'chave': nota['chave_externa'], 'numero': nota['numero'], 'erro': erro})
+
+        if falhas:
+            print(f"   ⚠️ {len(falhas)} notas não gravadas")
+        return gravadas, falhas
+
+    def _montar_nota(self, chave_unica, numero, fornecedor, valor, data_emissao, empresa, mes, ano, descricao):
+        """Linha de notas_fiscais de um recebimento do Omie (gravada em lote por gravar_notas)"""
+        return {
+            'chave_externa': chave_unica,
+            'numero': str(numero),
+            'descricao': descricao,
+            'fornecedor': fornecedor,
+            'valor': valor,
+            'data_emissao': data_emissao.date(),
+            'mes': mes,
+            'ano': ano,
+            'conta_id': 95,
+            'categoria': "Entrada NFe (Omie)",
+            'empresa': empresa
+        }
 
     def _recalcular_conta_95(self, meses_set):
         from app import db
         from models.nota_fiscal import NotaFiscal
-        from models.valor_mensal import ValorMensal
+        from services.meses_sujos import marcar_mes_sujo
+        from services.persistencia import gravar_valores
         
         print("🧮 Recalculando totais da Conta 95...")
+        totais = {}
         for mes, ano in meses_set:
             total = db.session.query(db.func.sum(NotaFiscal.valor))\
-                .filter(NotaFiscal.conta_id == 95, NotaFiscal.mes == mes, NotaFiscal.ano == ano)\
+                .filter(NotaFiscal.conta_id == 95, NotaFiscal.periodo == ano * 12 + mes - 1)\
                 .scalar() or 0.0
             
-            registro = ValorMensal.query.filter_by(conta_id=95, mes=mes, ano=ano).first()
-            if registro:
-                registro.valor = total
-            else:
-                novo = ValorMensal(conta_id=95, mes=mes, ano=ano, valor=total)
-                db.session.add(novo)
+            totais[(95, mes, ano)] = total
+            marcar_mes_sujo(mes, ano, {95})
             
             print(f"   -> {mes}/{ano}: Total atualizado para R$ {total:,.2f}")
         
+        # Atualizar ou criar os totais em um único upsert
+        gravar_valores(totais, commit=False)
         db.session.commit()
\ No newline at end of file
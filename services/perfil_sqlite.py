@@ -0,0 +1,72 @@
+import sqlite3
+from sqlalchemy import event
+from models import db
+
+# PRAGMAs aplicados a cada conexão nova com o SQLite (ordem importa:
+# busy_timeout antes de journal_mode, que precisa do lock do arquivo)
+PERFIS_SQLITE = {
+    # Padrão do SQLite: journal em arquivo separado (leitores esperam os commits)
+    'padrao': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+    },
+    # Vários workers: leitores não bloqueiam o cálculo (nem o contrário)
+    'producao': {
+        'busy_timeout': 5000,      # ms esperando o lock antes de "database is locked"
+        'journal_mode': 'WAL',     # persistente no arquivo do banco
+        'synchronous': 'NORMAL',   # seguro com WAL; fsync só no checkpoint
+        'cache_size': -20000,      # negativo = KiB (~20 MB por conexão)
+        'mmap_size': 268435456,    # 256 MB lidos via mmap
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def pragmas_do_perfil(perfil, extras=None):
+    """PRAGMAs de um perfil, com os ajustes de SQLITE_PRAGMAS por cima"""
+    if perfil not in PERFIS_SQLITE:
+        raise ValueError(f"Perfil SQLite inválido: {perfil} (use {', '.join(PERFIS_SQLITE)})")
+    pragmas = dict(PERFIS_SQLITE[perfil])
+    pragmas.update(extras or {})
+    return pragmas
+
+
+def aplicar_pragmas(conexao, pragmas):
+    """Executa os PRAGMAs em uma conexão sqlite3"""
+    cursor = conexao.cursor()
+    try:
+        for nome, valor in pragmas.items():
+            try:
+                cursor.execute(f"PRAGMA {nome}={valor}")
+            except sqlite3.OperationalError as e:
+                # Ex: journal_mode com outra conexão escrevendo; vale na próxima conexão
+                print(f"⚠️ PRAGMA {nome}={valor} não aplicado: {e}")
+    finally:
+        cursor.close()
+
+
+def ler_pragmas(nomes):
+    """Valores atuais dos PRAGMAs na conexão da sessão (para diagnóstico)"""
+    return {
+        nome: db.session.connection().exec_driver_sql(f"PRAGMA {nome}").scalar()
+        for nome in nomes
+    }
+
+
+def iniciar_banco(app):
+    """
+    Aplica o perfil SQLITE_PERFIL (+ SQLITE_PRAGMAS) a cada conexão do engine
+
+    Bancos que não são SQLite são ignorados.
+    """
+    pragmas = pragmas_do_perfil(
+        app.config.get('SQLITE_PERFIL', 'producao'), app.config.get('SQLITE_PRAGMAS')
+    )
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            return
+
+        @event.listens_for(engine, 'connect')
+        def _ao_conectar(conexao, registro):
+            aplicar_pragmas(conexao, pragmas)
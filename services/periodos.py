@@ -0,0 +1,25 @@
+def indice_periodo(mes, ano):
+    """Índice sequencial do mês (permite aritmética entre anos)"""
+    return ano * 12 + mes - 1
+
+
+def periodo_do_indice(indice):
+    """Inverso de indice_periodo: retorna (mes, ano)"""
+    return indice % 12 + 1, indice // 12
+
+
+def ler_periodo(texto):
+    """
+    Converte 'AAAA-MM' em (mes, ano)
+
+    Raises:
+        ValueError: fora do formato ou mês inválido (mensagem pronta para o usuário)
+    """
+    try:
+        ano, mes = texto.split('-')
+        mes, ano = int(mes), int(ano)
+    except ValueError:
+        raise ValueError(f"'{texto}' não está no formato AAAA-MM")
+    if not 1 <= mes <= 12:
+        raise ValueError(f"Mês inválido em '{texto}'")
+    return mes, ano
@@ -0,0 +1,264 @@
+import io
+import time
+from datetime import datetime
+from sqlalchemy import column, inspect, select, table, text
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db
+from models.valor_mensal import ValorMensal
+from models.nota_fiscal import NotaFiscal
+from models.mes_sujo import MesSujo
+from models.job_calculo import JobCalculo
+from models.versao_dados import VersaoDados
+from services.versao_dados import marcar_periodos_alterados
+
+# Índice único que o ON CONFLICT usa (criado pela migração migrar_valores_unicos.py)
+INDICE_UNICO = 'uq_valores_conta_ano_mes'
+
+# A partir de quantas linhas o PostgreSQL recebe o lote por COPY (tabela
+# temporária + INSERT ... SELECT) em vez de um INSERT com as linhas como parâmetros
+LINHAS_COPY = 500
+
+
+def adicionar_coluna_periodo(conexao, tabela):
+    """
+    Adiciona a coluna periodo (ano * 12 + mes - 1) e os índices que a usam
+    em uma tabela criada antes dela
+
+    Returns:
+        bool: True se a coluna foi criada agora
+    """
+    inspetor = inspect(conexao)
+    if not inspetor.has_table(tabela.name):
+        # Banco novo: db.create_all() cria a tabela já com a coluna
+        return False
+    criada = 'periodo' not in {c['name'] for c in inspetor.get_columns(tabela.name)}
+    if criada:
+        expressao = tabela.c.periodo.computed.sqltext
+        # O SQLite só aceita coluna gerada VIRTUAL no ALTER TABLE (o índice guarda o valor)
+        armazenamento = 'VIRTUAL' if conexao.dialect.name == 'sqlite' else 'STORED'
+        conexao.execute(text(
+            f"ALTER TABLE {tabela.name} ADD COLUMN periodo INTEGER "
+            f"GENERATED ALWAYS AS ({expressao}) {armazenamento}"
+        ))
+    for indice in tabela.indexes:
+        if 'periodo' in indice.columns:
+            indice.create(conexao, checkfirst=True)
+    return criada
+
+
+def verificar_esquema():
+    """
+    Confere se o banco já passou pelas migrações: coluna periodo em
+    valores_mensais / notas_fiscais, tabelas versoes_dados, meses_sujos e
+    jobs_calculo (migrar_indices.py) e índice único de valores_mensais
+    (migrar_valores_unicos.py)
+
+    Só lê o esquema (nenhum ALTER): chamado na inicialização do app, que
+    pode ter vários workers subindo ao mesmo tempo. Banco novo (sem as
+    tabelas) passa: db.create_all() cria tudo já no formato atual.
+
+    Raises:
+        RuntimeError: banco desatualizado, com a migração a executar
+    """
+    inspetor = inspect(db.engine)
+    faltando = [
+        f"coluna periodo em {tabela.name}"
+        for tabela in (ValorMensal.__table__, NotaFiscal.__table__)
+        if inspetor.has_table(tabela.name)
+        and 'periodo' not in {c['name'] for c in inspetor.get_columns(tabela.name)}
+    ]
+    migracoes = ['migrar_indices.py'] if faltando else []
+    if inspetor.has_table(ValorMensal.__tablename__):
+        for modelo in (VersaoDados, MesSujo, JobCalculo):
+            if not inspetor.has_table(modelo.__tablename__):
+                faltando.append(f"tabela {modelo.__tablename__}")
+                migracoes = ['migrar_indices.py']
+        indices = {i['name'] for i in inspetor.get_indexes(ValorMensal.__tablename__)}
+        if INDICE_UNICO not in indices:
+            faltando.append(f"índice {INDICE_UNICO}")
+            # As duplicadas saem antes do índice único
+            migracoes.insert(0, 'migrar_valores_unicos.py')
+    if faltando:
+        comandos = ' e '.join(f"'python {m}'" for m in migracoes)
+        raise RuntimeError(
+            f"Banco desatualizado (falta {', '.join(faltando)}). "
+            f"Execute {comandos} antes de iniciar o app."
+        )
+
+
+def _insert(tabela):
+    """INSERT com suporte a ON CONFLICT no dialeto do banco em uso"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(tabela)
+    return sqlite.insert(tabela)
+
+
+def _usar_copy(quantidade):
+    """Lote grande no PostgreSQL (drivers psycopg2 / psycopg): vai por COPY"""
+    dialeto = db.session.get_bind().dialect
+    return (dialeto.name == 'postgresql' and dialeto.driver in ('psycopg2', 'psycopg')
+            and quantidade >= LINHAS_COPY)
+
+
+def _campo_csv(valor):
+    """Um campo do CSV do COPY (vazio sem aspas = NULL)"""
+    if valor is None:
+        return ''
+    if isinstance(valor, str):
+        return '"' + valor.replace('"', '""') + '"'
+    return str(valor)
+
+
+def copiar_linhas(conexao, nome, colunas, linhas):
+    """
+    COPY ... FROM STDIN das linhas (dicts) para a tabela `nome` do PostgreSQL,
+    pela conexão DBAPI por baixo de `conexao` (mesma transação)
+    """
+    dados = ''.join(','.join(_campo_csv(linha[c]) for c in colunas) + '\n' for linha in linhas)
+    comando = f"COPY {nome} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = conexao.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(comando, io.StringIO(dados))    # psycopg2
+        else:
+            with cursor.copy(comando) as copia:                # psycopg 3
+                copia.write(dados)
+    finally:
+        cursor.close()
+
+
+def _copiar(tabela, colunas, linhas):
+    """
+    Envia as linhas por COPY para uma tabela temporária com as colunas
+    de `tabela`, descartada no fim da transação
+
+    Returns:
+        TableClause: a tabela temporária (origem do INSERT ... SELECT)
+    """
+    nome = f"carga_{tabela.name}"
+    conexao = db.session.connection()
+    conexao.exec_driver_sql(f"DROP TABLE IF EXISTS {nome}")
+    conexao.exec_driver_sql(
+        f"CREATE TEMP TABLE {nome} ON COMMIT DROP AS "
+        f"SELECT {', '.join(colunas)} FROM {tabela.name} WITH NO DATA"
+    )
+    copiar_linhas(conexao, nome, colunas, linhas)
+    return table(nome, *[column(c) for c in colunas])
+
+
+def _inserir_lote(tabela, linhas):
+    """
+    INSERT das linhas (lista de dicts com as mesmas chaves) no dialeto do
+    banco, pronto para receber o ON CONFLICT
+
+    Returns:
+        tuple: (comando, parâmetros para session.execute)
+    """
+    if _usar_copy(len(linhas)):
+        colunas = list(linhas[0])
+        carga = _copiar(tabela, colunas, linhas)
+        return postgresql.insert(tabela).from_select(colunas, select(carga)), None
+    return _insert(tabela), linhas
+
+
+def gravar_valores(valores, commit=True):
+    """
+    Grava valores mensais em lote, numa única transação
+
+    Um único INSERT ... ON CONFLICT (conta_id, ano, mes) DO UPDATE para todas
+    as linhas: não consulta antes o que já existe e não cria duplicatas
+    mesmo com escritores concorrentes. Linhas cujo valor não mudou não são
+    tocadas: data_atualizacao fica igual e o mês não muda de versão (nem de ETag).
+    No PostgreSQL, lotes grandes (importação do Excel, recálculo do
+    histórico) chegam por COPY.
+
+    Todas as escritas em valores_mensais devem passar por aqui.
+
+    Args:
+        valores: dict {(conta_id, mes, ano): valor}
+        commit: se False, deixa a transação aberta para o chamador (lote de meses)
+
+    Returns:
+        dict: linhas enviadas e tempo gasto (segundos)
+    """
+    inicio = time.perf_counter()
+    if not valores:
+        return {'linhas': 0, 'segundos': 0.0}
+
+    # Alterações pendentes do ORM precisam ir antes da escrita direta na tabela
+    db.session.flush()
+
+    agora = datetime.utcnow()
+    linhas = [
+        {'conta_id': conta_id, 'mes': mes, 'ano': ano, 'valor': valor,
+         'data_criacao': agora, 'data_atualizacao': agora}
+        for (conta_id, mes, ano), valor in valores.items()
+    ]
+
+    tabela = ValorMensal.__table__
+    comando, parametros = _inserir_lote(tabela, linhas)
+    comando = comando.on_conflict_do_update(
+        index_elements=[tabela.c.conta_id, tabela.c.ano, tabela.c.mes],
+        set_={'valor': comando.excluded.valor, 'data_atualizacao': comando.excluded.data_atualizacao},
+        where=tabela.c.valor.is_distinct_from(comando.excluded.valor)
+    )
+    alterados = db.session.execute(comando.returning(tabela.c.mes, tabela.c.ano), parametros).all()
+
+    # Escrita direta não passa pelo ORM: avisa os caches quais meses mudaram
+    # (o RETURNING só traz as linhas inseridas ou com valor diferente)
+    marcar_periodos_alterados(db.session, {(mes, ano) for mes, ano in alterados})
+
+    if commit:
+        db.session.commit()
+    else:
+        # Objetos já carregados no ORM ficaram desatualizados
+        db.session.expire_all()
+
+    return {
+        'linhas': len(linhas),
+        'segundos': time.perf_counter() - inicio
+    }
+
+
+def gravar_notas(notas, atualizar, commit=True):
+    """
+    Grava notas fiscais em lote: um único INSERT ... ON CONFLICT
+    (chave_externa) DO UPDATE, por COPY no PostgreSQL em lotes grandes
+
+    Notas repetidas no lote (mesma chave_externa) valem pela última.
+
+    Args:
+        notas: lista de dicts com as colunas de notas_fiscais (com chave_externa)
+        atualizar: colunas sobrescritas quando a nota já existe
+        commit: se False, deixa a transação aberta para o chamador
+
+    Returns:
+        dict: notas enviadas e tempo gasto (segundos)
+    """
+    inicio = time.perf_counter()
+    unicas = list({nota['chave_externa']: nota for nota in notas}.values())
+    if not unicas:
+        return {'linhas': 0, 'segundos': 0.0}
+
+    db.session.flush()
+
+    colunas = sorted({c for nota in unicas for c in nota})
+    linhas = [{c: nota.get(c) for c in colunas} for nota in unicas]
+
+    tabela = NotaFiscal.__table__
+    comando, parametros = _inserir_lote(tabela, linhas)
+    comando = comando.on_conflict_do_update(
+        index_elements=[tabela.c.chave_externa],
+        set_={c: comando.excluded[c] for c in atualizar}
+    )
+    db.session.execute(comando, parametros)
+
+    if commit:
+        db.session.commit()
+    else:
+        db.session.expire_all()
+
+    return {
+        'linhas': len(linhas),
+        'segundos': time.perf_counter() - inicio
+    }
@@ -0,0 +1,61 @@
+import numpy as np
+from services.snapshot_valores import obter_snapshot
+
+CONTA_RECEITA = 1
+CONTA_CUSTO_VARIAVEL = 15
+CONTA_CUSTO_FIXO = 17
+# Fluxo de Caixa DRE (ID 102 virtual) = soma dos IDs 23 a 26
+CONTAS_FLUXO_CAIXA_DRE = (23, 24, 25, 26)
+
+VARIANTES = ('I', 'II')
+
+
+def carregar_matrizes(anos, contas):
+    """
+    Lê as contas dos anos informados do snapshot em memória
+
+    Returns:
+        dict: {conta_id: matriz anos x 12 meses} (na ordem de anos)
+    """
+    return obter_snapshot().matrizes(anos, contas)
+
+
+def calcular_ponto_equilibrio(anos, variante='I'):
+    """
+    Ponto de equilíbrio mensal de um ou mais anos, com operações NumPy
+    sobre todos os meses de uma vez
+
+    I:  17 / (1 - (15 / 1))
+    II: (17 + 102) / (1 - (15 / 1)), onde 102 = 23 + 24 + 25 + 26
+
+    Meses sem receita positiva ou com custo variável >= receita valem 0.
+
+    Returns:
+        dict: {ano: [12 valores]}
+    """
+    if variante not in VARIANTES:
+        raise ValueError(f"Variante inválida: {variante} (use I ou II)")
+
+    anos = list(dict.fromkeys(anos))
+    contas = [CONTA_RECEITA, CONTA_CUSTO_VARIAVEL, CONTA_CUSTO_FIXO]
+    if variante == 'II':
+        contas += CONTAS_FLUXO_CAIXA_DRE
+    m = carregar_matrizes(anos, contas)
+
+    receita = m[CONTA_RECEITA]
+    if variante == 'II':
+        # Na variante II todas as contas entram em valor absoluto (inclusive a receita)
+        receita = np.abs(receita)
+    custo_variavel = np.abs(m[CONTA_CUSTO_VARIAVEL])
+    total_a_cobrir = np.abs(m[CONTA_CUSTO_FIXO])
+    if variante == 'II':
+        total_a_cobrir = total_a_cobrir + sum(np.abs(m[c]) for c in CONTAS_FLUXO_CAIXA_DRE)
+
+    # Margem de contribuição (1 - razão) só é válida com receita > 0 e razão < 1
+    com_receita = receita > 0
+    razao = custo_variavel / np.where(com_receita, receita, 1.0)
+    valido = com_receita & (razao < 1)
+    margem = np.where(valido, 1 - razao, 1.0)
+    ponto = np.where(valido, total_a_cobrir / margem, 0.0)
+
+    return {ano: ponto[i].tolist() for i, ano in enumerate(anos)}
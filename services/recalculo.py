@@ -0,0 +1,24 @@
+from services.calculadora import ANO_MINIMO_CALCULO
+from services.motor_vetorial import calcular_periodo
+
+
+def recalcular_historico(inicio, fim, incluir_historico=False):
+    """
+    Recalcula todas as contas calculadas entre inicio e fim ((mes, ano))
+
+    Usa o motor vetorial: uma consulta para o período inteiro, todas as
+    fórmulas avaliadas sobre todos os meses de uma vez (acumulados como
+    somas prefixadas, ver services/acumulados.py) e uma única transação
+    na gravação.
+
+    Returns:
+        dict: meses calculados, tempos de cada etapa e dados da gravação
+    """
+    ano_minimo = 0 if incluir_historico else ANO_MINIMO_CALCULO
+    resultado = calcular_periodo(inicio, fim, commit=True, ano_minimo=ano_minimo)
+    return {
+        'meses': resultado['meses'],
+        'tempos': resultado['tempos'],
+        'linhas': resultado['linhas'],
+        'segundos_gravacao': resultado['tempos'].get('gravacao', 0.0)
+    }
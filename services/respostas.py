@@ -0,0 +1,115 @@
+import gzip
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+# Dependências opcionais: sem elas o app usa o json padrão e só gzip
+try:
+    import orjson
+    # Mesmo resultado do json padrão do Flask: chaves ordenadas, chaves numéricas
+    # como texto e datas no formato do Flask (via default)
+    OPCOES_ORJSON = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+                     | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME)
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# ============================================
+# SERIALIZAÇÃO JSON
+# ============================================
+
+class ProvedorJSONRapido(DefaultJSONProvider):
+    """
+    Provedor JSON do Flask que usa orjson quando disponível
+
+    Tudo que passa por jsonify usa este provedor. Tipos que o orjson não
+    conhece caem no serializador padrão do Flask.
+    """
+
+    def _bytes(self, obj):
+        try:
+            return orjson.dumps(obj, default=self.default, option=OPCOES_ORJSON)
+        except TypeError:
+            return super().dumps(obj).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._bytes(obj).decode()
+
+    def response(self, *args, **kwargs):
+        if args and kwargs:
+            raise TypeError("jsonify() recebe argumentos posicionais ou nomeados, não os dois")
+        obj = args[0] if len(args) == 1 else (list(args) if args else kwargs)
+        return self._app.response_class(self._bytes(obj), mimetype=self.mimetype)
+
+
+def serializadores_disponiveis():
+    """Nomes aceitos em JSON_SERIALIZADOR neste ambiente"""
+    return ['padrao'] + (['orjson'] if orjson is not None else [])
+
+
+# ============================================
+# COMPRESSÃO
+# ============================================
+
+def codificacoes_disponiveis():
+    """Codificações suportadas, na ordem de preferência"""
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+
+def escolher_codificacao(accept_encodings):
+    """Melhor codificação aceita pelo cliente (ou None)"""
+    for codificacao in codificacoes_disponiveis():
+        if accept_encodings[codificacao]:
+            return codificacao
+    return None
+
+
+def comprimir(corpo, codificacao, nivel=6):
+    if codificacao == 'br':
+        return brotli.compress(corpo, quality=min(nivel, 11))
+    return gzip.compress(corpo, compresslevel=nivel)
+
+
+def comprimir_resposta(resposta, minimo, nivel):
+    """
+    Comprime respostas JSON acima de `minimo` bytes com br/gzip,
+    conforme o Accept-Encoding da requisição
+    """
+    if (resposta.status_code != 200 or resposta.direct_passthrough
+            or resposta.mimetype != 'application/json'
+            or 'Content-Encoding' in resposta.headers):
+        return resposta
+
+    resposta.vary.add('Accept-Encoding')
+    corpo = resposta.get_data()
+    if len(corpo) < minimo:
+        return resposta
+
+    codificacao = escolher_codificacao(request.accept_encodings)
+    if codificacao is None:
+        return resposta
+
+    resposta.set_data(comprimir(corpo, codificacao, nivel))
+    resposta.headers['Content-Encoding'] = codificacao
+    # A versão comprimida tem outros bytes: o ETag passa a ser fraco
+    etag, fraco = resposta.get_etag()
+    if etag and not fraco:
+        resposta.set_etag(etag, weak=True)
+    return resposta
+
+
+def iniciar_respostas(app):
+    """Configura o serializador (JSON_SERIALIZADOR) e a compressão (COMPRESSAO_*)"""
+    if app.config.get('JSON_SERIALIZADOR', 'orjson') == 'orjson' and orjson is not None:
+        app.json = ProvedorJSONRapido(app)
+
+    if app.config.get('COMPRESSAO_ATIVA', True):
+        minimo = app.config.get('COMPRESSAO_MIN_BYTES', 1024)
+        nivel = app.config.get('COMPRESSAO_NIVEL', 6)
+        app.after_request(lambda resposta: comprimir_resposta(resposta, minimo, nivel))
@@ -0,0 +1,170 @@
+from services.periodos import indice_periodo, periodo_do_indice
+from services.snapshot_valores import obter_snapshot
+from services.indice_periodos import obter_indice_periodos
+
+MESES_ABREV = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+
+def buscar_series(contas, ano_de=None, ano_ate=None):
+    """
+    Histórico mensal de várias contas, lido do snapshot em memória
+
+    Args:
+        contas: lista de IDs de conta
+        ano_de, ano_ate: intervalo de anos (inclusive); None = sem limite
+
+    Returns:
+        dict: {'anos': [anos com dados], 'series': {conta_id: {ano: [12 valores]}}}
+              Toda conta pedida tem todos os anos (meses sem valor = 0)
+    """
+    contas = list(dict.fromkeys(contas))
+    registros = obter_snapshot().registros(contas, ano_de, ano_ate)
+    return montar_series(registros, contas)
+
+
+def montar_series(registros, contas, anos=None):
+    """
+    Pivota linhas (conta_id, ano, mes, valor) em {'anos', 'series'} (ver buscar_series)
+
+    anos: anos da resposta (padrão: os anos com dados dessas contas)
+    """
+    contas = list(dict.fromkeys(contas))
+    registros = [r for r in registros if r[0] in contas]
+    if anos is None:
+        anos = {ano for _, ano, _, _ in registros}
+    anos = sorted(anos)
+    series = {conta_id: {ano: [0] * 12 for ano in anos} for conta_id in contas}
+    for conta_id, ano, mes, valor in registros:
+        if 1 <= mes <= 12 and ano in series[conta_id]:
+            series[conta_id][ano][mes - 1] = round(valor or 0.0, 2)
+
+    return {'anos': anos, 'series': series}
+
+
+def anos_historico(ano_de):
+    """Anos com dados em qualquer conta, a partir de ano_de (anos dos gráficos históricos)"""
+    return [ano for ano in obter_indice_periodos().anos() if ano >= ano_de]
+
+
+def historico_conta(conta_id, ano_de, anos_padrao):
+    """
+    Histórico de uma conta no formato dos gráficos anuais
+    ({'meses': [...], 'dados_2023': [...], 'dados_2024': [...], ...})
+
+    Os anos são os que têm dados em qualquer conta a partir de ano_de
+    (anos_padrao se não houver nenhum), mesmo sem valores desta conta.
+    """
+    anos = anos_historico(ano_de) or anos_padrao
+    registros = obter_snapshot().registros([conta_id], ano_de)
+    por_ano = montar_series(registros, [conta_id], anos)['series'][conta_id]
+
+    resposta = {'meses': MESES_ABREV}
+    for ano in anos:
+        resposta[f'dados_{ano}'] = por_ano[ano]
+    return resposta
+
+
+# Anos do gráfico de receita acumulada (evolucao_receita.html)
+ANOS_RECEITA_ACUMULADA = [2022, 2023, 2024, 2025]
+
+
+def receita_acumulada_historico():
+    """
+    Receita Acumulada Anual (ID 101) de 2022 a 2025 e o % de crescimento de
+    cada ano sobre o anterior, comparando o mesmo período: dezembro, e em
+    2025 o último mês com receita acumulada
+    """
+    from services.acumulados import CONTA_ACUMULADO_ANUAL
+
+    registros = obter_snapshot().registros(
+        [CONTA_ACUMULADO_ANUAL], ANOS_RECEITA_ACUMULADA[0], ANOS_RECEITA_ACUMULADA[-1]
+    )
+    series = montar_series(registros, [CONTA_ACUMULADO_ANUAL], ANOS_RECEITA_ACUMULADA)
+    dados = {str(ano): valores for ano, valores in series['series'][CONTA_ACUMULADO_ANUAL].items()}
+
+    # Descobrir qual é o último mês com dados em 2025
+    ultimo_mes_2025 = 12
+    for mes in range(11, -1, -1):  # De dezembro até janeiro
+        if dados['2025'][mes] > 0:
+            ultimo_mes_2025 = mes + 1  # +1 porque array começa em 0
+            break
+
+    # Calcular % de crescimento vs ano anterior (COMPARANDO MESMO PERÍODO)
+    crescimentos = {}
+    for ano in ANOS_RECEITA_ACUMULADA[1:]:
+        # Para 2025, comparar só até o último mês disponível
+        mes_comparacao = ultimo_mes_2025 - 1 if ano == 2025 else 11
+        valor_atual = dados[str(ano)][mes_comparacao]
+        valor_anterior = dados[str(ano - 1)][mes_comparacao]
+
+        if valor_anterior > 0:
+            crescimentos[str(ano)] = round(((valor_atual - valor_anterior) / valor_anterior) * 100, 2)
+        else:
+            crescimentos[str(ano)] = 0
+
+    resposta = {'meses': MESES_ABREV}
+    for ano in ANOS_RECEITA_ACUMULADA:
+        resposta[f'dados_{ano}'] = dados[str(ano)]
+    resposta['crescimentos'] = crescimentos
+    resposta['ultimo_mes_2025'] = ultimo_mes_2025  # Informação extra para debug
+    return resposta
+
+
+# Contas dos gráficos de evolução do dashboard
+CONTAS_EVOLUCAO = {
+    'receita': 1,
+    'ebitda': 21,
+    'resultado_operacional': 18,
+    'margem_contribuicao': 16,
+    'fluxo_caixa_livre': 28
+}
+
+
+def ultimo_periodo_evolucao():
+    """Último (mes, ano) com valores (em qualquer conta), ou None"""
+    periodos = obter_indice_periodos().periodos
+    return periodos[0] if periodos else None
+
+
+def evolucao_mensal(inicio, fim):
+    """
+    Evolução mensal das contas do dashboard entre inicio e fim ((mes, ano)),
+    lida do snapshot só pelas contas necessárias (pode atravessar anos)
+
+    Returns:
+        dict: arrays por coluna ({'meses': ['01/2025', ...], 'receita': [...], ...});
+              meses sem valor em nenhuma conta ficam de fora
+    """
+    registros = obter_snapshot().registros(CONTAS_EVOLUCAO.values(), inicio[1], fim[1])
+    return montar_evolucao(registros, inicio, fim, obter_indice_periodos().linhas)
+
+
+def montar_evolucao(registros, inicio, fim, periodos):
+    """
+    Pivota linhas (conta_id, ano, mes, valor) nos arrays da evolução (ver evolucao_mensal)
+
+    periodos: meses (mes, ano) com valor em qualquer conta; os demais ficam de fora
+    e os que não têm valor nas contas dos gráficos entram com 0
+    """
+    idx_inicio = indice_periodo(*inicio)
+    idx_fim = indice_periodo(*fim)
+    contas = set(CONTAS_EVOLUCAO.values())
+
+    por_mes = {
+        indice: {} for indice in (indice_periodo(mes, ano) for mes, ano in periodos)
+        if idx_inicio <= indice <= idx_fim
+    }
+    for conta_id, ano, mes, valor in registros:
+        indice = indice_periodo(mes, ano)
+        if conta_id in contas and indice in por_mes:
+            por_mes[indice][conta_id] = valor
+
+    dados = {'meses': []}
+    dados.update({coluna: [] for coluna in CONTAS_EVOLUCAO})
+    for indice in sorted(por_mes):
+        mes, ano = periodo_do_indice(indice)
+        valores = por_mes[indice]
+        dados['meses'].append(f"{mes:02d}/{ano}")
+        for coluna, conta_id in CONTAS_EVOLUCAO.items():
+            dados[coluna].append(valores.get(conta_id, 0))
+    return dados
@@ -0,0 +1,177 @@
+import threading
+import numpy as np
+from models import db
+from models.valor_mensal import ValorMensal
+from services.versao_dados import versao_dados
+
+# Snapshot do processo (trocado inteiro a cada recarga; nunca alterado no lugar)
+_trava = threading.Lock()
+_snapshot = None
+
+
+class SnapshotValores:
+    """
+    Cópia em memória de valores_mensais, em colunas NumPy
+    (conta_id, ano, mes, valor) ordenadas por (ano, mes, conta_id),
+    com o mapa (conta_id, ano, mes) -> posição
+
+    As leituras do dashboard respondem daqui, sem consultar o banco.
+    Linhas repetidas para a mesma (conta, ano, mes): vale a última gravada (maior id).
+    Valores nulos viram 0.0.
+    """
+
+    def __init__(self, conta_id, ano, mes, valor, versao=0):
+        # Estável: entre linhas repetidas a ordem de id se mantém
+        ordem = np.lexsort((conta_id, mes, ano))
+        conta_id, ano, mes, valor = conta_id[ordem], ano[ordem], mes[ordem], valor[ordem]
+
+        self.indice = {
+            chave: i for i, chave in enumerate(zip(conta_id.tolist(), ano.tolist(), mes.tolist()))
+        }
+        if len(self.indice) < len(conta_id):
+            manter = np.array(sorted(self.indice.values()), dtype=np.int64)
+            conta_id, ano, mes, valor = conta_id[manter], ano[manter], mes[manter], valor[manter]
+            self.indice = {
+                chave: i for i, chave in enumerate(zip(conta_id.tolist(), ano.tolist(), mes.tolist()))
+            }
+
+        self.conta_id = conta_id
+        self.ano = ano
+        self.mes = mes
+        self.valor = valor
+        # Índice do período (ano * 12 + mes - 1), crescente: fatias por busca binária
+        self.periodo = ano * 12 + mes - 1
+        self.versao = versao
+
+    @classmethod
+    def carregar(cls, versao=0):
+        """Lê a tabela inteira numa consulta só de colunas"""
+        registros = db.session.query(
+            ValorMensal.conta_id, ValorMensal.ano, ValorMensal.mes, ValorMensal.valor
+        ).order_by(ValorMensal.id).all()
+
+        return cls(
+            np.array([r[0] for r in registros], dtype=np.int64),
+            np.array([r[1] for r in registros], dtype=np.int64),
+            np.array([r[2] for r in registros], dtype=np.int64),
+            np.array([r[3] or 0.0 for r in registros], dtype=np.float64),
+            versao
+        )
+
+    def __len__(self):
+        return len(self.valor)
+
+    def _fatia(self, inicio, fim):
+        """Posições dos períodos inicio..fim (índices de período, inclusive)"""
+        esquerda = 0 if inicio is None else int(np.searchsorted(self.periodo, inicio, 'left'))
+        direita = len(self.periodo) if fim is None else int(np.searchsorted(self.periodo, fim, 'right'))
+        return slice(esquerda, direita)
+
+    def valor_de(self, conta_id, mes, ano, padrao=0.0):
+        """Valor de uma conta em um mês (padrao se não houver linha)"""
+        posicao = self.indice.get((conta_id, ano, mes))
+        return padrao if posicao is None else float(self.valor[posicao])
+
+    def valores_mes(self, mes, ano):
+        """{conta_id: valor} de um mês"""
+        indice = ano * 12 + mes - 1
+        fatia = self._fatia(indice, indice)
+        return dict(zip(self.conta_id[fatia].tolist(), self.valor[fatia].tolist()))
+
+    def registros(self, contas=None, ano_de=None, ano_ate=None):
+        """
+        Linhas (conta_id, ano, mes, valor) em tipos Python, no formato das
+        consultas de colunas; filtros opcionais por contas e intervalo de anos
+        """
+        fatia = self._fatia(
+            None if ano_de is None else ano_de * 12,
+            None if ano_ate is None else ano_ate * 12 + 11
+        )
+        colunas = [self.conta_id[fatia], self.ano[fatia], self.mes[fatia], self.valor[fatia]]
+        if contas is not None:
+            filtro = np.isin(colunas[0], list(contas))
+            colunas = [coluna[filtro] for coluna in colunas]
+        return list(zip(*(coluna.tolist() for coluna in colunas)))
+
+    def matrizes(self, anos, contas):
+        """{conta_id: matriz anos x 12 meses} (na ordem de anos; sem valor = 0)"""
+        anos = list(anos)
+        fatia = self._fatia(min(anos) * 12, max(anos) * 12 + 11) if anos else slice(0, 0)
+        conta_id, ano, mes, valor = (
+            self.conta_id[fatia], self.ano[fatia], self.mes[fatia], self.valor[fatia]
+        )
+        filtro = np.isin(ano, anos) & np.isin(conta_id, list(contas)) & (mes >= 1) & (mes <= 12)
+        conta_id, ano, mes, valor = conta_id[filtro], ano[filtro], mes[filtro], valor[filtro]
+        # Linha de cada registro = posição do seu ano em `anos`
+        ordem = np.argsort(anos)
+        linha = ordem[np.searchsorted(np.asarray(anos, dtype=np.int64)[ordem], ano)]
+
+        matrizes = {}
+        for c in contas:
+            matriz = np.zeros((len(anos), 12))
+            da_conta = conta_id == c
+            matriz[linha[da_conta], mes[da_conta] - 1] = valor[da_conta]
+            matrizes[c] = matriz
+        return matrizes
+
+    def matriz(self, inicio, fim, contas=None):
+        """
+        Valores dos períodos inicio..fim (índices de período, inclusive)
+        em uma matriz contas x períodos (sem valor = nan)
+
+        Returns:
+            tuple: (lista de contas, matriz); contas=None usa todas as contas
+                   com valor no intervalo, em ordem crescente
+        """
+        fatia = self._fatia(inicio, fim)
+        conta_id, periodo, valor = self.conta_id[fatia], self.periodo[fatia], self.valor[fatia]
+        if contas is None:
+            contas = np.unique(conta_id).tolist()
+        else:
+            contas = list(dict.fromkeys(contas))
+
+        matriz = np.full((len(contas), max(fim - inicio + 1, 0)), np.nan)
+        if not contas or not len(conta_id):
+            return contas, matriz
+
+        # Linha de cada registro = posição da sua conta em `contas`
+        ordem = np.argsort(contas)
+        ordenadas = np.asarray(contas, dtype=np.int64)[ordem]
+        posicao = np.minimum(np.searchsorted(ordenadas, conta_id), len(contas) - 1)
+        pedida = ordenadas[posicao] == conta_id
+        matriz[ordem[posicao[pedida]], periodo[pedida] - inicio] = valor[pedida]
+        return contas, matriz
+
+    def periodos(self):
+        """Conjunto de (mes, ano) com ao menos um valor"""
+        unicos = np.unique(self.periodo)
+        return {(int(p % 12) + 1, int(p // 12)) for p in unicos}
+
+    def estatisticas(self):
+        return {
+            'linhas': len(self),
+            'versao_dados': self.versao,
+            'bytes': int(sum(c.nbytes for c in (self.conta_id, self.ano, self.mes, self.valor, self.periodo)))
+        }
+
+
+def obter_snapshot():
+    """
+    Snapshot atual dos valores mensais (carregado na primeira leitura)
+
+    A versão dos dados é conferida no banco a cada chamada: um commit que
+    alterou valores, feito por qualquer processo, força a recarga.
+    """
+    global _snapshot
+    versao = versao_dados()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.versao == versao:
+        return snapshot
+
+    with _trava:
+        if _snapshot is None or _snapshot.versao != versao:
+            # A versão é lida antes da carga: um commit durante a leitura
+            # muda a versão e força outra recarga na próxima chamada
+            _snapshot = SnapshotValores.carregar(versao)
+        return _snapshot
+
@@ -0,0 +1,98 @@
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import db
+from models.valor_mensal import ValorMensal
+from models.mes_sujo import MesSujo
+from models.versao_dados import VersaoDados
+from services.periodos import indice_periodo
+
+# Contadores de versão dos dados, guardados no banco (tabela versoes_dados):
+# sobem na mesma transação que altera valores mensais, então todos os
+# processos (workers do servidor, 'flask recalcular', scripts) enxergam a
+# mesma versão. Servem de carimbo para caches de leitura.
+PERIODO_GLOBAL = -1
+PERIODO_TODOS = -2      # alteração sem meses conhecidos: vale para todos os meses
+
+# Chave em session.info com os meses alterados na transação em andamento
+_CHAVE_SESSAO = 'periodos_alterados'
+
+
+def criar_tabela_versoes(conexao):
+    """Cria a tabela em bancos criados antes do controle de versão (ver migrar_indices.py)"""
+    VersaoDados.__table__.create(conexao, checkfirst=True)
+
+
+def versao_dados():
+    """Versão global: muda a cada alteração em qualquer mês"""
+    versao = db.session.execute(
+        select(VersaoDados.versao).where(VersaoDados.periodo == PERIODO_GLOBAL)
+    ).scalar()
+    return versao or 0
+
+
+def versao_periodo(mes, ano):
+    """Versão de um mês: muda só quando aquele (mes, ano) é alterado (ou todos os meses)"""
+    return db.session.execute(
+        select(func.coalesce(func.sum(VersaoDados.versao), 0))
+        .where(VersaoDados.periodo.in_((indice_periodo(mes, ano), PERIODO_TODOS)))
+    ).scalar()
+
+
+def registrar_alteracao(sessao, periodos):
+    """
+    Incrementa, na transação da sessão, a versão global e a de cada (mes, ano)
+    informado (None = todos os meses)
+    """
+    if sessao.get_bind().dialect.name == 'postgresql':
+        insert = postgresql.insert
+    else:
+        insert = sqlite.insert
+
+    indices = {PERIODO_GLOBAL}
+    for periodo in periodos:
+        indices.add(PERIODO_TODOS if periodo is None else indice_periodo(*periodo))
+    # Sempre na mesma ordem: transações concorrentes travam as linhas sem deadlock
+    comando = insert(VersaoDados.__table__).values(
+        [{'periodo': indice, 'versao': 1} for indice in sorted(indices)]
+    )
+    sessao.execute(comando.on_conflict_do_update(
+        index_elements=['periodo'],
+        set_={'versao': VersaoDados.__table__.c.versao + 1}
+    ))
+
+
+def marcar_periodos_alterados(sessao, periodos):
+    """
+    Anota meses alterados na transação da sessão; as versões sobem no commit
+
+    O ORM é rastreado sozinho (after_flush); escritas diretas na tabela
+    (ex: gravar_valores) e Query.delete() / update() precisam chamar esta
+    função. None no lugar de um (mes, ano) vale para todos os meses.
+    """
+    sessao.info.setdefault(_CHAVE_SESSAO, set()).update(periodos)
+
+
+@event.listens_for(Session, 'after_flush')
+def _ao_gravar(sessao, contexto):
+    periodos = {
+        (obj.mes, obj.ano)
+        for obj in list(sessao.new) + list(sessao.dirty) + list(sessao.deleted)
+        if isinstance(obj, (ValorMensal, MesSujo))
+    }
+    if periodos:
+        marcar_periodos_alterados(sessao, periodos)
+
+
+@event.listens_for(Session, 'before_commit')
+def _ao_confirmar(sessao):
+    # Grava o que o ORM tem pendente antes: o after_flush anota os meses
+    sessao.flush()
+    periodos = sessao.info.pop(_CHAVE_SESSAO, None)
+    if periodos:
+        registrar_alteracao(sessao, periodos)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _ao_desfazer(sessao):
+    sessao.info.pop(_CHAVE_SESSAO, None)
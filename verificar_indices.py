@@ -0,0 +1,203 @@
+"""
+Verificação dos planos de consulta (EXPLAIN QUERY PLAN) das rotas e
+cálculos mais usados
+
+Executa cada rota / cálculo em uma cópia do banco configurado (com as
+migrações de índices aplicadas), captura as consultas que leem
+valores_mensais ou notas_fiscais e falha (código de saída 1) se alguma
+delas varrer a tabela inteira em vez de buscar por um índice.
+
+Leituras completas de propósito (sem WHERE, ex: carga do snapshot em
+memória) não entram na verificação. Um cenário que não captura nenhuma
+consulta também falha, exceto as rotas respondidas pelo snapshot em
+memória: essas aparecem como não verificadas (se passarem a consultar o
+banco, os planos são verificados como os demais). Só para SQLite
+(EXPLAIN QUERY PLAN); o PostgreSQL é verificado por verificar_postgres.py.
+
+Uso: python verificar_indices.py
+"""
+
+import contextlib
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+TABELAS = ('valores_mensais', 'notas_fiscais')
+VARREDURA = re.compile(r'^SCAN (%s)\b' % '|'.join(TABELAS))
+FILTRO = re.compile(r'\bWHERE\b', re.IGNORECASE)
+
+
+def preparar_banco(pasta):
+    """Copia o banco configurado para `pasta` e aponta o app para a cópia"""
+    from config import Config
+    if not Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite:///'):
+        print("❌ Verificação só para SQLite (DATABASE_URL aponta para outro banco)")
+        sys.exit(2)
+    origem = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '', 1)
+    copia = os.path.join(pasta, 'financeiro.db')
+    shutil.copy(origem, copia)
+    # A Config já foi lida: altera a classe (o app ainda não foi importado)
+    Config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{copia}'
+    # Sem cache de respostas: toda rota executa suas consultas
+    Config.CACHE_RESPOSTAS_ATIVO = False
+    # A cópia é migrada abaixo (migrar_valores_unicos / migrar_indices)
+    Config.VERIFICAR_ESQUEMA = False
+    return origem
+
+
+def cenarios(mes, ano):
+    """
+    (nome, função, em_memoria) de cada rota / cálculo verificado
+
+    em_memoria: respondida pelo snapshot (services/snapshot_valores.py),
+    sem consultas filtradas a valores_mensais / notas_fiscais
+    """
+    from app import app
+    from services.calculadora import calcular_mes
+    from services.motor_vetorial import calcular_periodo
+    from services.recalculo import recalcular_historico
+    from services.meses_sujos import marcar_mes_sujo, recalcular_se_sujo
+    from services.omie_service import OmieService
+    from models import db
+
+    cliente = app.test_client()
+
+    def rota(url):
+        def executar():
+            resposta = cliente.get(url)
+            if resposta.status_code != 200:
+                raise RuntimeError(f"{url}: status {resposta.status_code}")
+        return executar
+
+    def salvar_dados():
+        valor = cliente.get(f'/api/valores/{mes}/{ano}').get_json().get('2', 0)
+        resposta = cliente.post('/api/salvar-dados', json={'mes': mes, 'ano': ano, 'valores': {'2': valor + 1}})
+        # O recálculo roda na fila (outra thread): espera terminar antes do próximo cenário
+        job_id = resposta.get_json()['job_id']
+        for _ in range(100):
+            if cliente.get(f'/api/jobs/{job_id}').get_json()['status'] in ('concluido', 'erro'):
+                break
+            time.sleep(0.1)
+
+    def recalculo_conta_95():
+        OmieService()._recalcular_conta_95({(mes, ano)})
+
+    def mes_sujo():
+        marcar_mes_sujo(mes, ano, {2})
+        db.session.commit()
+        recalcular_se_sujo(mes, ano)
+
+    return [
+        ('GET /api/valores/<mes>/<ano>', rota(f'/api/valores/{mes}/{ano}'), True),
+        ('GET /api/dashboard/kpis/<mes>/<ano>', rota(f'/api/dashboard/kpis/{mes}/{ano}'), True),
+        ('GET /api/dashboard/composicao/<mes>/<ano>', rota(f'/api/dashboard/composicao/{mes}/{ano}'), True),
+        ('GET /api/dashboard/bundle', rota(f'/api/dashboard/bundle?mes={mes}&ano={ano}'), True),
+        ('GET /api/valores?de=&ate=', rota(f'/api/valores?de={ano - 1}-01&ate={ano}-{mes:02d}'), True),
+        ('GET /api/series', rota('/api/series?contas=1,37,101&de=2022'), True),
+        ('GET /api/dashboard/evolucao', rota('/api/dashboard/evolucao?ultimos=24'), True),
+        ('GET /api/evolucao-receita/ponto-equilibrio', rota(f'/api/evolucao-receita/ponto-equilibrio?ano={ano}'), True),
+        ('GET /api/anos-disponiveis', rota('/api/anos-disponiveis'), True),
+        ('GET /api/periodos', rota('/api/periodos'), True),
+        ('GET /api/calculo/explain', rota(f'/api/calculo/explain/{mes}/{ano}'), False),
+        ('POST /api/salvar-dados', salvar_dados, False),
+        ('recálculo de mês sujo', mes_sujo, False),
+        ('calcular_mes', lambda: calcular_mes(mes, ano), False),
+        ('motor vetorial (ano)', lambda: calcular_periodo((1, ano), (mes, ano)), False),
+        ('flask recalcular (ano)', lambda: recalcular_historico((1, ano), (mes, ano)), False),
+        ('conta 95 (soma das NF-e)', recalculo_conta_95, False),
+    ]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as pasta:
+        origem = preparar_banco(pasta)
+
+        from app import app
+        from models import db
+        from models.valor_mensal import ValorMensal
+        from sqlalchemy import event
+        import migrar_valores_unicos
+        import migrar_indices
+
+        print(f"🔎 Planos de consulta (cópia de {origem})")
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrar_valores_unicos.migrar()
+            migrar_indices.migrar()
+
+        with app.app_context():
+            ultimo = db.session.query(db.func.max(ValorMensal.periodo)).scalar()
+            mes, ano = ultimo % 12 + 1, ultimo // 12
+            engine = db.engine
+
+        principal = threading.current_thread()
+        capturadas = []
+
+        def capturar(conexao, cursor, sql, parametros, contexto, executemany):
+            # Só a thread principal (a fila de cálculo roda em outra)
+            if threading.current_thread() is not principal:
+                return
+            if executemany:
+                parametros = parametros[0] if parametros else ()
+            capturadas.append((sql, parametros))
+
+        event.listen(engine, 'before_cursor_execute', capturar)
+
+        falhas = 0
+        nao_verificadas = []
+        for nome, executar, em_memoria in cenarios(mes, ano):
+            capturadas.clear()
+            with app.app_context():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    executar()
+                consultas = list(dict.fromkeys(
+                    (sql, tuple(p) if isinstance(p, (list, tuple)) else p)
+                    for sql, p in capturadas
+                    if any(t in sql for t in TABELAS)
+                    and FILTRO.search(sql)
+                    and sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))
+                ))
+                planos = []
+                for sql, parametros in consultas:
+                    linhas = db.session.connection().exec_driver_sql(
+                        f"EXPLAIN QUERY PLAN {sql}", parametros
+                    ).all()
+                    planos.append((sql, [linha[-1] for linha in linhas]))
+                db.session.rollback()
+
+            if not planos and em_memoria:
+                nao_verificadas.append(nome)
+                print(f"\n⏭️ {nome}: não verificada (respondida pelo snapshot em memória)")
+                continue
+            if not planos:
+                falhas += 1
+                print(f"\n❌ {nome}: nenhuma consulta capturada")
+                continue
+
+            ruins = [(sql, plano) for sql, plano in planos if any(VARREDURA.match(p) for p in plano)]
+            falhas += len(ruins)
+            print(f"\n{'❌' if ruins else '✅'} {nome} ({len(planos)} consultas)")
+            for sql, plano in planos:
+                resumo = ' '.join(sql.split())
+                resumo = resumo[:110] + ('...' if len(resumo) > 110 else '')
+                print(f"   {resumo}")
+                for passo in plano:
+                    marca = '⚠️ ' if VARREDURA.match(passo) else '   '
+                    print(f"     {marca}{passo}")
+
+        event.remove(engine, 'before_cursor_execute', capturar)
+
+    if nao_verificadas:
+        print(f"\n⏭️ {len(nao_verificadas)} rotas não verificadas (snapshot em memória, sem consultas ao banco)")
+    if falhas:
+        print(f"\n❌ {falhas} falhas: consultas que varrem a tabela inteira ou cenários sem consultas")
+        sys.exit(1)
+    print("\n✅ Nenhuma consulta das rotas verificadas varre valores_mensais ou notas_fiscais")
+
+
+if __name__ == '__main__':
+    main()